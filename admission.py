@@ -0,0 +1,212 @@
+from collections import OrderedDict, deque
+from typing import Optional
+from urllib.parse import parse_qs
+import asyncio
+import time
+from fastapi.responses import JSONResponse
+from config import settings
+
+# Control de admisión: cada clase de ruta tiene un límite de peticiones en curso
+# y una cola de espera acotada. Si la cola está llena (o la espera excede el
+# tiempo máximo) se responde 503 de inmediato en lugar de acumular latencia.
+
+RETRY_AFTER = settings.admission_retry_after
+
+# Rutas operativas que nunca se limitan
+EXEMPT_PATHS = {"/health", "/metrics", "/docs", "/redoc", "/openapi.json"}
+
+# Rutas que ejecutan bcrypt
+AUTH_PATHS = {"/token", "/register/"}
+
+# Rutas que recorren colecciones completas o procesan muchos documentos
+HEAVY_PREFIXES = ("/export/", "/import/", "/search/", "/admin/indexes")
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+class Overloaded(Exception):
+    def __init__(self, route_class: str):
+        super().__init__(route_class)
+        self.route_class = route_class
+
+
+# Clase de la ruta: auth, heavy, light o write; None si la ruta no se limita
+def classify(method: str, path: str, query_string: bytes = b"") -> Optional[str]:
+    if path in EXEMPT_PATHS:
+        return None
+    if path in AUTH_PATHS:
+        return "auth"
+    if path.startswith(HEAVY_PREFIXES) or path.endswith("/bulk"):
+        return "heavy"
+    if method not in ("GET", "HEAD"):
+        return "write"
+    # Listados completos sin paginar (?all=true)
+    query = parse_qs(query_string.decode("latin-1"))
+    if query.get("all", [""])[-1].lower() in TRUE_VALUES:
+        return "heavy"
+    return "light"
+
+
+# Semáforo con cola de espera acotada y tiempo máximo de espera
+class ConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, queue_limit: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue_limit:
+            self.rejected += 1
+            raise Overloaded(self.name)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Se nos cedió un lugar que ya no vamos a usar
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(exc, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise Overloaded(self.name) from None
+            raise
+        self.admitted += 1
+
+    # El lugar se cede directamente al siguiente en la cola, sin pasar por `active`
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+limiters = {
+    "auth": ConcurrencyLimiter(
+        "auth", settings.admission_auth_concurrency, settings.admission_auth_queue, settings.admission_queue_timeout
+    ),
+    "heavy": ConcurrencyLimiter(
+        "heavy", settings.admission_heavy_concurrency, settings.admission_heavy_queue, settings.admission_queue_timeout
+    ),
+    "light": ConcurrencyLimiter(
+        "light", settings.admission_light_concurrency, settings.admission_light_queue, settings.admission_queue_timeout
+    ),
+    "write": ConcurrencyLimiter(
+        "write", settings.admission_write_concurrency, settings.admission_write_queue, settings.admission_queue_timeout
+    ),
+}
+
+def stats() -> dict:
+    result = {}
+    for name, limiter in limiters.items():
+        for key, value in limiter.stats().items():
+            result[f"{name}_{key}"] = value
+    return result
+
+
+# Middleware ASGI: el lugar se conserva hasta terminar de enviar la respuesta,
+# incluidas las respuestas en streaming (exportaciones)
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        route_class = None
+        if scope["type"] == "http" and settings.admission_enabled:
+            route_class = classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = limiters[route_class]
+        try:
+            await limiter.acquire()
+        except Overloaded:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server overloaded, try again later"},
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+# Límite de peticiones por usuario (token bucket) según el `sub` del JWT. Se
+# usa desde get_current_user, que corre en el event loop, así que no necesita lock
+class RateLimiter:
+    def __init__(self, rate: float, burst: float, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.allowed = 0
+        self.limited = 0
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    # Regresa 0 si se admite la petición, o los segundos a esperar si no
+    def acquire(self, key: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self.burst
+        else:
+            tokens, updated_at = bucket
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+            self.allowed += 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self.limited += 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # Olvidar un usuario inactivo equivale a devolverle el bucket lleno
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "users": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+rate_limiter = RateLimiter(settings.rate_limit_per_second, settings.rate_limit_burst, settings.rate_limit_max_users)
@@ -1,16 +1,35 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import hashlib
+import multiprocessing
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from schemas import UserInDB
+from config import settings
 
 # Secret key para codificar y decodificar los JWT
 SECRET_KEY = "mysecretkey"  # Debes usar una clave secreta segura
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # El token expira en 30 minutos
 
+# Factor de costo de bcrypt; los hashes con un costo menor se marcan para re-hashear
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+
+# Pool de procesos para bcrypt: tamaño y máximo de operaciones en espera
+PASSWORD_POOL_SIZE = settings.password_pool_size
+PASSWORD_QUEUE_LIMIT = settings.password_queue_limit
+
 # Contexto de PassLib para encriptar las contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
 
 # Funciones de hashing de contraseñas
 def hash_password(password: str) -> str:
@@ -19,6 +38,53 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Verifica la contraseña y, si el hash usa un costo antiguo, regresa el nuevo hash
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# bcrypt consume ~250ms de CPU, así que se ejecuta en un pool de procesos
+# para no bloquear el event loop
+class PasswordPoolBusy(Exception):
+    pass
+
+_password_pool: Optional[ProcessPoolExecutor] = None
+_password_pending = 0
+
+def get_password_pool() -> ProcessPoolExecutor:
+    global _password_pool
+    if _password_pool is None:
+        # forkserver: el pool se crea cuando Motor ya tiene hilos y sockets abiertos,
+        # y hacer fork de un proceso con hilos puede bloquear al hijo
+        _password_pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_POOL_SIZE, mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _password_pool
+
+def shutdown_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown(wait=True)
+        _password_pool = None
+
+async def run_in_password_pool(func, *args):
+    global _password_pending
+    # Si la cola está llena se rechaza en lugar de acumular más trabajo
+    if _password_pending >= PASSWORD_QUEUE_LIMIT:
+        raise PasswordPoolBusy()
+    _password_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_password_pool(), func, *args)
+    finally:
+        _password_pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await run_in_password_pool(hash_password, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await run_in_password_pool(verify_and_update_password, plain_password, hashed_password)
+
 # Función para crear el token de acceso (JWT)
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -36,4 +102,75 @@ def verify_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+
+# Usuario autenticado: objeto ligero construido a partir de los claims del JWT
+class Principal(NamedTuple):
+    username: str
+    id: str
+    is_teacher: bool
+
+# Caché LRU con TTL de tokens ya verificados, indexada por el digest del token.
+# Una entrada nunca vive más allá del `exp` del token.
+class TokenCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[Principal, float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, principal: Principal, exp: Optional[float]):
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = self._key(token)
+        self._entries[key] = (principal, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+TOKEN_CACHE_SIZE = settings.token_cache_size
+TOKEN_CACHE_TTL = settings.token_cache_ttl
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+
+# Verificar el token usando la caché; solo en un fallo se decodifica el JWT
+def get_principal_from_token(token: str) -> Optional[Principal]:
+    principal = token_cache.get(token)
+    if principal is not None:
+        return principal
+
+    payload = verify_token(token)
+    if not payload or "sub" not in payload:
+        return None
+
+    principal = Principal(
+        username=payload["sub"],
+        id=payload["sub"],  # O como sea que almacenaste el ID en tu JWT
+        is_teacher=payload.get("is_teacher", False),
+    )
+    token_cache.put(token, principal, payload.get("exp"))
+    return principal
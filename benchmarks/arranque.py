@@ -0,0 +1,39 @@
+# Benchmark de arranque: mide cuánto tarda en importarse `main` (lo que paga
+# cada worker al iniciar) en procesos nuevos. Ejecutar antes y después de un
+# cambio para comparar.
+#
+# Uso:
+#   python benchmarks/arranque.py --repeticiones 10
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def medir_importacion():
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=RAIZ, check=True)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main(args):
+    # La primera ejecución calienta los .pyc y no se cuenta
+    medir_importacion()
+    tiempos = [medir_importacion() for _ in range(args.repeticiones)]
+    print(json.dumps({
+        "repeticiones": args.repeticiones,
+        "mediana_ms": round(statistics.median(tiempos), 1),
+        "minimo_ms": round(min(tiempos), 1),
+        "maximo_ms": round(max(tiempos), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=10)
+    main(parser.parse_args())
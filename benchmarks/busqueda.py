@@ -0,0 +1,101 @@
+# Benchmark del type-ahead: latencia por tecla (prefijos de 1 a 4 letras) sobre
+# los alumnos sembrados, llamando directamente a search() sin HTTP. Con un
+# mongod real también reporta el plan de cada consulta (llaves y documentos
+# examinados, y si hubo un SORT en memoria), que debe quedar acotado por el
+# tamaño de la página y no por cuántos nombres coinciden.
+#
+# Uso:
+#   MONGO_URI=mongodb://localhost:27017 python -m benchmarks.busqueda --alumnos 100000
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks import datos
+from benchmarks.concurrencia import percentil
+
+# Lo que teclea un usuario: cada prefijo de nombres y apellidos comunes
+PALABRAS = ["ana", "maria", "garcia", "lopez", "flores", "sofia"]
+
+
+def prefijos():
+    return [palabra[:n] for palabra in PALABRAS for n in range(1, 5)]
+
+
+def etapas(plan):
+    yield plan["stage"]
+    for llave in ("inputStage", "queryPlan"):
+        if llave in plan:
+            yield from etapas(plan[llave])
+    for hijo in plan.get("inputStages", []):
+        yield from etapas(hijo)
+
+
+async def plan(cursor):
+    explicacion = await cursor.explain()
+    ejecucion = explicacion["executionStats"]
+    return {
+        "etapas": list(etapas(explicacion["queryPlanner"]["winningPlan"])),
+        "llaves_examinadas": ejecucion["totalKeysExamined"],
+        "documentos_examinados": ejecucion["totalDocsExamined"],
+    }
+
+
+async def main(args):
+    # La configuración de Mongo debe fijarse antes de importar la aplicación
+    os.environ["MONGO_URI"] = args.mongo
+    os.environ["MONGO_DB"] = args.base
+    from db import db, mongo
+    from search import FULL_NAME_INDEX, TERMS_INDEX, search
+
+    mongo.connect()
+    try:
+        await datos.sembrar(db, args.alumnos, args.profesores, args.materias, args.inscripciones, args.semilla)
+
+        latencias = {}
+        for _ in range(args.repeticiones):
+            for prefijo in prefijos():
+                inicio = time.perf_counter()
+                await search("students", prefijo, args.limite, typeahead=True)
+                latencias.setdefault(len(prefijo), []).append((time.perf_counter() - inicio) * 1000)
+
+        resultados = {
+            f"{letras}_letras": {
+                "consultas": len(valores),
+                "p50_ms": round(statistics.median(valores), 2),
+                "p99_ms": round(percentil(valores, 99), 2),
+            }
+            for letras, valores in sorted(latencias.items())
+        }
+        p99 = max(resultado["p99_ms"] for resultado in resultados.values())
+        reporte = {"alumnos": args.alumnos, "limite": args.limite, "resultados": resultados, "p99_ms": p99, "menor_a_20ms": p99 < 20}
+
+        # mongomock no implementa explain
+        if not args.mongo.startswith("mongomock://"):
+            import re
+            patron = re.compile("^a")
+            reporte["planes"] = {
+                "nombre_completo": await plan(
+                    db.students.find({"search_terms.0": patron}).sort(FULL_NAME_INDEX).limit(args.limite + 1)
+                ),
+                "otras_palabras": await plan(
+                    db.students.find({"search_terms": patron, "search_terms.0": {"$not": patron}}).hint(TERMS_INDEX).limit(args.limite + 1)
+                ),
+            }
+    finally:
+        mongo.close()
+
+    print(json.dumps(reporte, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--base", default="benchmark_busqueda")
+    parser.add_argument("--limite", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    datos.agregar_argumentos(parser)
+    parser.set_defaults(profesores=200, materias=500, inscripciones=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+# Benchmark de asignación de calificaciones: compara la escritura por petición
+# (assign_grade, un find_one_and_update cada vez) contra la escritura agrupada
+# (grade_buffer, un bulk_write por lote) con muchos clientes concurrentes,
+# como en un cierre de calificaciones. Llama directamente a las funciones, sin
+# HTTP, para medir solo el camino de escritura.
+#
+# Uso:
+#   MONGO_URI=mongodb://localhost:27017 python -m benchmarks.calificaciones --clientes 200
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+from benchmarks import datos
+from benchmarks.concurrencia import percentil
+
+
+async def cliente(escribir, rng, enrollment_ids, peticiones, latencias):
+    for _ in range(peticiones):
+        inicio = time.perf_counter()
+        await escribir(rng.choice(enrollment_ids), round(rng.uniform(0, 10), 1))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+
+
+async def medir(nombre, escribir, args, enrollment_ids):
+    latencias = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*[
+        cliente(escribir, random.Random(args.semilla + i), enrollment_ids, args.peticiones, latencias)
+        for i in range(args.clientes)
+    ])
+    duracion = time.perf_counter() - inicio
+    return {
+        "modo": nombre,
+        "escrituras": len(latencias),
+        "escrituras_por_s": round(len(latencias) / duracion, 1),
+        "p50_ms": round(statistics.median(latencias), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+    }
+
+
+async def main(args):
+    # La configuración de Mongo debe fijarse antes de importar la aplicación
+    os.environ["MONGO_URI"] = args.mongo
+    os.environ["MONGO_DB"] = args.base
+    os.environ["GRADE_BUFFER_MAX_BATCH"] = str(args.lote)
+    os.environ["GRADE_BUFFER_MAX_DELAY_MS"] = str(args.espera_ms)
+    from db import db, mongo
+    from crud import assign_grade
+    from grade_buffer import grade_buffer
+
+    mongo.connect()
+    try:
+        sembrado = await datos.sembrar(db, args.alumnos, args.profesores, args.materias, args.inscripciones, args.semilla)
+        # Un conjunto pequeño de inscripciones concentra escrituras repetidas, como en un cierre real
+        enrollment_ids = sembrado["muestra"]["enrollment_ids"][:args.inscripciones_activas]
+
+        resultados = [
+            await medir("por_peticion", assign_grade, args, enrollment_ids),
+            await medir("agrupada", grade_buffer.submit, args, enrollment_ids),
+        ]
+        await grade_buffer.drain()
+        resultados[1]["buffer"] = grade_buffer.stats()
+    finally:
+        mongo.close()
+
+    print(json.dumps({"clientes": args.clientes, "peticiones_por_cliente": args.peticiones, "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--base", default="benchmark_calificaciones")
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--peticiones", type=int, default=50, help="Calificaciones por cliente")
+    parser.add_argument("--inscripciones-activas", type=int, default=5000)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--espera-ms", type=float, default=20.0)
+    datos.agregar_argumentos(parser)
+    parser.set_defaults(alumnos=10000, profesores=200, materias=500, inscripciones=100000)
+    asyncio.run(main(parser.parse_args()))
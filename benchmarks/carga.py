@@ -0,0 +1,159 @@
+# Prueba de carga reproducible: siembra un conjunto de datos sintético y ejecuta
+# clientes asíncronos concurrentes contra la `app` real de FastAPI en el mismo
+# proceso (httpx + ASGITransport, sin red). Reporta throughput y latencias
+# p50/p95/p99 por escenario en JSON.
+#
+# Uso:
+#   python -m benchmarks.carga --mongo mongodb://localhost:27017 --clientes 50 --duracion 30
+#   python -m benchmarks.carga --mongo mongomock:// --alumnos 2000 --inscripciones 20000
+#
+# Con mongomock las latencias no representan a un mongod real (todo se resuelve
+# en memoria y sin índices), pero todos los escenarios se ejecutan.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+
+import httpx
+
+from benchmarks import datos
+from benchmarks.concurrencia import percentil
+
+# Escenarios y su peso relativo dentro de la mezcla de tráfico
+ESCENARIOS = {
+    "login": 1,
+    "enrollments": 10,
+    "subjects_list": 10,
+    "professors_list": 5,
+    "students_list": 5,
+    "subject_detail": 10,
+    "assign_grade": 3,
+    "create_subject": 1,
+    "search_typeahead": 5,
+}
+
+
+def construir_peticion(escenario, rng, muestra, tokens):
+    teacher = {"Authorization": f"Bearer {tokens['teacher']}"}
+    student = {"Authorization": f"Bearer {tokens['student']}"}
+    if escenario == "login":
+        usuario = f"bench_student_{rng.randrange(datos.USUARIOS_POR_ROL)}"
+        return "POST", "/token", {"data": {"username": usuario, "password": datos.PASSWORD}}
+    if escenario == "enrollments":
+        return "GET", f"/enrollments/{rng.choice(muestra['student_ids'])}", {"headers": student}
+    if escenario == "subjects_list":
+        return "GET", "/subjects/", {}
+    if escenario == "professors_list":
+        return "GET", "/professors/", {}
+    if escenario == "students_list":
+        return "GET", "/students/", {}
+    if escenario == "subject_detail":
+        return "GET", f"/subjects/{rng.choice(muestra['subject_ids'])}", {}
+    if escenario == "assign_grade":
+        params = {"enrollment_id": rng.choice(muestra["enrollment_ids"]), "grade": round(rng.uniform(0, 10), 1)}
+        return "PUT", "/assign_grade/", {"params": params, "headers": teacher}
+    if escenario == "search_typeahead":
+        prefijo = rng.choice(datos.APELLIDOS)[:rng.randint(2, 5)]
+        return "GET", "/search/students", {"params": {"q": prefijo, "typeahead": "true", "limit": 10}}
+    if escenario == "create_subject":
+        body = {"name": "Benchmark", "description": "Materia creada por la prueba de carga",
+                "professor_id": rng.choice(muestra["professor_ids"])}
+        return "POST", "/subjects/", {"json": body, "headers": teacher}
+    raise ValueError(escenario)
+
+
+async def obtener_token(http, usuario):
+    respuesta = await http.post("/token", data={"username": usuario, "password": datos.PASSWORD})
+    respuesta.raise_for_status()
+    return respuesta.json()["access_token"]
+
+
+async def cliente(http, rng, muestra, tokens, fin, latencias, errores):
+    nombres = list(ESCENARIOS)
+    pesos = [ESCENARIOS[n] for n in nombres]
+    while time.perf_counter() < fin:
+        escenario = rng.choices(nombres, pesos)[0]
+        metodo, ruta, kwargs = construir_peticion(escenario, rng, muestra, tokens)
+        inicio = time.perf_counter()
+        try:
+            respuesta = await http.request(metodo, ruta, **kwargs)
+            if respuesta.status_code >= 400:
+                errores[escenario] = errores.get(escenario, 0) + 1
+        except Exception:
+            errores[escenario] = errores.get(escenario, 0) + 1
+        latencias.setdefault(escenario, []).append((time.perf_counter() - inicio) * 1000)
+
+
+def resumen(latencias, errores, duracion):
+    total = sum(len(v) for v in latencias.values())
+    return {
+        "peticiones": total,
+        "rps": round(total / duracion, 1),
+        "escenarios": {
+            escenario: {
+                "peticiones": len(v),
+                "errores": errores.get(escenario, 0),
+                "rps": round(len(v) / duracion, 1),
+                "p50_ms": round(statistics.median(v), 2),
+                "p95_ms": round(percentil(v, 95), 2),
+                "p99_ms": round(percentil(v, 99), 2),
+            }
+            for escenario, v in sorted(latencias.items())
+        },
+    }
+
+
+async def main(args):
+    # La configuración de Mongo debe fijarse antes de importar la aplicación
+    os.environ["MONGO_URI"] = args.mongo
+    os.environ["MONGO_DB"] = args.base
+    # Todos los clientes comparten dos tokens; el límite por usuario convertiría la carga en 429
+    os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+    from db import db
+    from main import app
+
+    sembrado = await datos.sembrar(db, args.alumnos, args.profesores, args.materias, args.inscripciones, args.semilla)
+    muestra = sembrado.pop("muestra")
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as http:
+            tokens = {
+                "teacher": await obtener_token(http, "bench_teacher_0"),
+                "student": await obtener_token(http, "bench_student_0"),
+            }
+            latencias, errores = {}, {}
+            inicio = time.perf_counter()
+            fin = inicio + args.duracion
+            await asyncio.gather(*[
+                cliente(http, random.Random(args.semilla + i), muestra, tokens, fin, latencias, errores)
+                for i in range(args.clientes)
+            ])
+            duracion = time.perf_counter() - inicio
+
+    reporte = {
+        "mongo": args.mongo,
+        "clientes": args.clientes,
+        "duracion_s": round(duracion, 1),
+        "datos": sembrado,
+        **resumen(latencias, errores, duracion),
+    }
+    salida = json.dumps(reporte, indent=2)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(salida)
+    print(salida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    datos.agregar_argumentos(parser)
+    parser.add_argument("--mongo", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--base", default="proyecto_ll_benchmark")
+    parser.add_argument("--clientes", type=int, default=50)
+    parser.add_argument("--duracion", type=float, default=30, help="Segundos de carga")
+    parser.add_argument("--salida", help="Archivo donde guardar el reporte JSON")
+    asyncio.run(main(parser.parse_args()))
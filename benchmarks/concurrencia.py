@@ -0,0 +1,73 @@
+# Benchmark de concurrencia: lanza N clientes simultáneos contra un servidor
+# uvicorn ya levantado y reporta la latencia p50/p95/p99 por endpoint.
+#
+# Uso (ejecutar una vez con la versión síncrona y otra con la asíncrona):
+#   uvicorn main:app --port 8000
+#   python benchmarks/concurrencia.py --url http://127.0.0.1:8000 --clientes 200
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+async def cliente(http, rutas, peticiones, latencias, errores):
+    for i in range(peticiones):
+        ruta = rutas[i % len(rutas)]
+        inicio = time.perf_counter()
+        try:
+            respuesta = await http.get(ruta)
+            if respuesta.status_code >= 500:
+                errores.append(respuesta.status_code)
+        except httpx.HTTPError as e:
+            errores.append(str(e))
+        latencias.setdefault(ruta, []).append((time.perf_counter() - inicio) * 1000)
+
+
+async def main(args):
+    latencias = {}
+    errores = []
+    limites = httpx.Limits(max_connections=args.clientes)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=60) as http:
+        inicio = time.perf_counter()
+        await asyncio.gather(*[
+            cliente(http, args.rutas, args.peticiones, latencias, errores)
+            for _ in range(args.clientes)
+        ])
+        duracion = time.perf_counter() - inicio
+
+    total = sum(len(v) for v in latencias.values())
+    reporte = {
+        "clientes": args.clientes,
+        "peticiones": total,
+        "errores": len(errores),
+        "rps": round(total / duracion, 1),
+        "rutas": {
+            ruta: {
+                "p50_ms": round(statistics.median(v), 2),
+                "p95_ms": round(percentil(v, 95), 2),
+                "p99_ms": round(percentil(v, 99), 2),
+            }
+            for ruta, v in latencias.items()
+        },
+    }
+    print(json.dumps(reporte, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clientes", type=int, default=200)
+    parser.add_argument("--peticiones", type=int, default=50, help="Peticiones por cliente")
+    parser.add_argument("--rutas", nargs="+", default=["/subjects/", "/professors/", "/students/"])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+# Verificación del modo multi-worker: levanta uvicorn con varios workers
+# (MULTI_WORKER=true) contra un mongod local, calienta las cachés de todos los
+# workers, actualiza una materia y mide cuánto tardan todos en servir el dato
+# nuevo. Termina con código 1 si no convergen dentro del límite.
+#
+# Uso:
+#   MONGO_URI=mongodb://localhost:27017 python benchmarks/consistencia.py --workers 4
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def esperar_servidor(http, limite):
+    fin = time.perf_counter() + limite
+    while time.perf_counter() < fin:
+        try:
+            if (await http.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no respondió a tiempo")
+
+
+async def leer_nombres(http, subject_id, lecturas):
+    respuestas = await asyncio.gather(*[http.get(f"/subjects/{subject_id}") for _ in range(lecturas)])
+    return {r.json()["name"] for r in respuestas}
+
+
+async def verificar(args):
+    # Sin keep-alive: cada petición abre una conexión nueva y puede caer en cualquier worker
+    limites = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.puerto}", limits=limites, timeout=30) as http:
+        await esperar_servidor(http, 30)
+
+        usuario, password = f"consistencia_{uuid.uuid4().hex[:8]}", "consistencia"
+        await http.post("/register/", json={"username": usuario, "password": password, "is_teacher": True})
+        token = (await http.post("/token", data={"username": usuario, "password": password})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        nombre = f"Consistencia {uuid.uuid4().hex[:8]}"
+        await http.post("/subjects/", json={"name": nombre, "description": "Prueba", "professor_id": "-"}, headers=headers)
+        encontrados = (await http.get("/search/subjects", params={"q": nombre, "typeahead": "true"})).json()["items"]
+        subject_id = encontrados[0]["_id"]
+
+        # Calentar la caché de entidades en todos los workers
+        await leer_nombres(http, subject_id, args.lecturas * 4)
+
+        nuevo = f"{nombre} actualizada"
+        await http.put(f"/subjects/{subject_id}", json={"name": nuevo, "description": "Prueba", "professor_id": "-"}, headers=headers)
+        inicio = time.perf_counter()
+
+        while True:
+            nombres = await leer_nombres(http, subject_id, args.lecturas)
+            retraso = (time.perf_counter() - inicio) * 1000
+            if nombres == {nuevo}:
+                return {"workers": args.workers, "convergio": True, "retraso_ms": round(retraso, 1)}
+            if retraso > args.limite_ms:
+                return {"workers": args.workers, "convergio": False, "retraso_ms": round(retraso, 1), "nombres": sorted(nombres)}
+
+
+def main(args):
+    entorno = {**os.environ, "MULTI_WORKER": "true"}
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(args.workers), "--port", str(args.puerto)],
+        cwd=RAIZ, env=entorno,
+    )
+    try:
+        resultado = asyncio.run(verificar(args))
+    finally:
+        servidor.terminate()
+        servidor.wait(timeout=30)
+    print(json.dumps(resultado, indent=2))
+    sys.exit(0 if resultado["convergio"] else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--lecturas", type=int, default=50, help="Lecturas concurrentes por ronda")
+    parser.add_argument("--limite-ms", type=float, default=3000, help="Retraso máximo aceptado")
+    main(parser.parse_args())
@@ -0,0 +1,149 @@
+# Generador de datos sintéticos reproducibles (misma semilla, mismos datos).
+# Inserta alumnos, profesores, materias, inscripciones y usuarios de prueba
+# directamente con insert_many por bloques, sin pasar por la API.
+#
+# Uso:
+#   MONGO_URI=mongodb://localhost:27017 python -m benchmarks.datos --alumnos 100000
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from bson import ObjectId
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Sofía", "Carlos", "Valeria", "Diego", "Fernanda", "Jorge"]
+APELLIDOS = ["García", "Hernández", "López", "Martínez", "González", "Pérez", "Rodríguez", "Sánchez", "Ramírez", "Flores"]
+ESPECIALIDADES = ["Matemáticas", "Física", "Química", "Historia", "Programación", "Redes", "Bases de datos"]
+
+# Contraseña de todos los usuarios de prueba
+PASSWORD = "benchmark"
+USUARIOS_POR_ROL = 10
+TAMANO_BLOQUE = 10000
+
+
+def fecha_nacimiento(rng, min_edad, max_edad):
+    return (date(2006, 1, 1) - timedelta(days=rng.randint(min_edad * 365, max_edad * 365))).isoformat()
+
+
+def persona(rng, i):
+    return {
+        "first_name": rng.choice(NOMBRES),
+        "last_name": f"{rng.choice(APELLIDOS)} {i}",
+        "address": f"Calle {rng.randint(1, 999)} #{rng.randint(1, 99)}, Colonia Centro",
+    }
+
+
+async def insertar_por_bloques(collection, documentos):
+    bloque = []
+    total = 0
+    for documento in documentos:
+        bloque.append(documento)
+        if len(bloque) >= TAMANO_BLOQUE:
+            await collection.insert_many(bloque, ordered=False)
+            total += len(bloque)
+            bloque = []
+    if bloque:
+        await collection.insert_many(bloque, ordered=False)
+        total += len(bloque)
+    return total
+
+
+async def sembrar(db, alumnos, profesores, materias, inscripciones, semilla=42, muestra=10000):
+    from auth import hash_password
+    from db import ensure_indexes
+    from search import with_search_terms
+
+    rng = random.Random(semilla)
+    inicio = time.perf_counter()
+
+    for nombre in ("students", "professors", "subjects", "enrollments", "users", "subject_stats", "student_stats"):
+        await db[nombre].drop()
+    await ensure_indexes()
+
+    # Los IDs se generan del lado del cliente para poder referenciarlos
+    student_ids = [ObjectId() for _ in range(alumnos)]
+    professor_ids = [ObjectId() for _ in range(profesores)]
+    subject_ids = [ObjectId() for _ in range(materias)]
+
+    await insertar_por_bloques(db.students, (
+        with_search_terms("students", {"_id": _id, **persona(rng, i), "dob": fecha_nacimiento(rng, 0, 8), "photo_url": None, "photo_status": None})
+        for i, _id in enumerate(student_ids)
+    ))
+    await insertar_por_bloques(db.professors, (
+        with_search_terms("professors", {"_id": _id, **persona(rng, i), "dob": fecha_nacimiento(rng, 10, 40), "specialty": rng.choice(ESPECIALIDADES)})
+        for i, _id in enumerate(professor_ids)
+    ))
+    await insertar_por_bloques(db.subjects, (
+        with_search_terms("subjects", {
+            "_id": _id,
+            "name": f"{rng.choice(ESPECIALIDADES)} {i}",
+            "description": f"Curso de {rng.choice(ESPECIALIDADES).lower()} nivel {rng.randint(1, 8)}",
+            "professor_id": str(rng.choice(professor_ids)),
+        })
+        for i, _id in enumerate(subject_ids)
+    ))
+
+    # Cada alumno se inscribe en materias distintas (índice único student_id + subject_id)
+    por_alumno = min(materias, max(1, inscripciones // max(1, alumnos)))
+    enrollment_sample = []
+
+    def generar_inscripciones():
+        for student_id in student_ids:
+            for subject_index in rng.sample(range(materias), por_alumno):
+                _id = ObjectId()
+                if len(enrollment_sample) < muestra:
+                    enrollment_sample.append(str(_id))
+                yield {
+                    "_id": _id,
+                    "student_id": str(student_id),
+                    "subject_id": str(subject_ids[subject_index]),
+                    "grade": round(rng.uniform(0, 10), 1) if rng.random() < 0.7 else None,
+                }
+
+    total_inscripciones = await insertar_por_bloques(db.enrollments, generar_inscripciones())
+
+    # Usuarios de prueba: un solo hash de bcrypt compartido para no pagar su costo por usuario
+    hashed = hash_password(PASSWORD)
+    await db.users.insert_many([
+        {"username": f"bench_{rol}_{i}", "hashed_password": hashed, "is_teacher": rol == "teacher"}
+        for rol in ("teacher", "student") for i in range(USUARIOS_POR_ROL)
+    ])
+
+    return {
+        "semilla": semilla,
+        "alumnos": alumnos,
+        "profesores": profesores,
+        "materias": materias,
+        "inscripciones": total_inscripciones,
+        "segundos": round(time.perf_counter() - inicio, 1),
+        "muestra": {
+            "student_ids": [str(_id) for _id in student_ids[:muestra]],
+            "subject_ids": [str(_id) for _id in subject_ids[:muestra]],
+            "professor_ids": [str(_id) for _id in professor_ids[:muestra]],
+            "enrollment_ids": enrollment_sample,
+        },
+    }
+
+
+def agregar_argumentos(parser):
+    parser.add_argument("--alumnos", type=int, default=100000)
+    parser.add_argument("--profesores", type=int, default=2000)
+    parser.add_argument("--materias", type=int, default=5000)
+    parser.add_argument("--inscripciones", type=int, default=1000000)
+    parser.add_argument("--semilla", type=int, default=42)
+
+
+async def main(args):
+    from db import db
+
+    resultado = await sembrar(db, args.alumnos, args.profesores, args.materias, args.inscripciones, args.semilla)
+    resultado.pop("muestra")
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    agregar_argumentos(parser)
+    asyncio.run(main(parser.parse_args()))
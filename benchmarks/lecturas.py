@@ -0,0 +1,70 @@
+# Microbenchmark de lecturas confiables: costo por fila de armar la respuesta de
+# un listado de alumnos reconstruyendo AlumnoInDB (con sus validadores, como
+# antes) contra trusted_document, sin re-validar. Mide también la serialización.
+#
+# Uso:
+#   python benchmarks/lecturas.py --documentos 50000
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crud import trusted_document
+from schemas import AlumnoInDB
+from search import with_search_terms
+from serialization import dumps
+
+
+# Documentos con la misma forma que los que guarda create_student
+def generar_documentos(n):
+    return [
+        with_search_terms("students", {
+            "_id": ObjectId(),
+            "first_name": f"Nombre{i}",
+            "last_name": f"Apellido{i}",
+            "dob": f"2000-01-{1 + i % 28:02d}",
+            "address": f"Calle {i} #123, Colonia Centro",
+            "photo_url": None,
+            "photo_status": None,
+        })
+        for i in range(n)
+    ]
+
+
+def validado(docs):
+    return [AlumnoInDB(**doc, id=str(doc["_id"])) for doc in docs]
+
+
+def confiable(docs):
+    return [trusted_document(AlumnoInDB, doc) for doc in docs]
+
+
+def main(args):
+    docs = generar_documentos(args.documentos)
+    resultados = {}
+    for nombre, funcion in [("validado", validado), ("confiable", confiable)]:
+        construir = min(timeit.repeat(lambda: funcion(docs), number=1, repeat=args.repeticiones))
+        completo = min(timeit.repeat(lambda: dumps(funcion(docs)), number=1, repeat=args.repeticiones))
+        resultados[nombre] = {
+            "construir_us_por_fila": round(construir / len(docs) * 1e6, 3),
+            "con_serializacion_us_por_fila": round(completo / len(docs) * 1e6, 3),
+            "total_ms": round(completo * 1000, 1),
+        }
+    resultados["aceleracion"] = round(
+        resultados["validado"]["con_serializacion_us_por_fila"] / resultados["confiable"]["con_serializacion_us_por_fila"], 1
+    )
+    # Ambos caminos deben producir exactamente el mismo JSON
+    resultados["misma_salida"] = dumps(validado(docs[:100])) == dumps(confiable(docs[:100]))
+    print(json.dumps({"documentos": args.documentos, "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documentos", type=int, default=50000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    main(parser.parse_args())
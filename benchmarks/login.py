@@ -0,0 +1,41 @@
+# Benchmark de verificación de contraseñas: mide cuántas verificaciones bcrypt
+# por segundo se logran con distintos tamaños del pool de procesos.
+#
+# Uso:
+#   python benchmarks/login.py --operaciones 64
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auth
+
+
+async def medir(tamano, operaciones, hashed):
+    auth.shutdown_password_pool()
+    auth.PASSWORD_POOL_SIZE = tamano
+    # Calentar el pool para no medir el arranque de los procesos
+    await asyncio.gather(*[auth.verify_and_update_password_async("secreto", hashed) for _ in range(tamano)])
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[auth.verify_and_update_password_async("secreto", hashed) for _ in range(operaciones)])
+    duracion = time.perf_counter() - inicio
+    return {"procesos": tamano, "logins_por_segundo": round(operaciones / duracion, 2)}
+
+
+async def main(args):
+    hashed = auth.hash_password("secreto")
+    tamanos = sorted({1, 2, 4, os.cpu_count() or 1})
+    resultados = [await medir(t, args.operaciones, hashed) for t in tamanos]
+    auth.shutdown_password_pool()
+    print(json.dumps({"bcrypt_rounds": auth.BCRYPT_ROUNDS, "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--operaciones", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,60 @@
+# Microbenchmark de serialización: compara el camino anterior
+# (convert_objectid_to_str + jsonable_encoder + json) con la respuesta orjson
+# sobre una carga de documentos tipo alumno.
+#
+# Uso:
+#   python benchmarks/serializacion.py --documentos 10000
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crud import convert_objectid_to_str
+from serialization import BSONJSONResponse
+
+
+def generar_documentos(n):
+    return [
+        {
+            "_id": ObjectId(),
+            "first_name": f"Nombre{i}",
+            "last_name": f"Apellido{i}",
+            "dob": datetime(2000, 1, 1 + i % 28),
+            "address": f"Calle {i} #123, Colonia Centro",
+            "photo_url": None,
+            "photo_status": None,
+        }
+        for i in range(n)
+    ]
+
+
+def camino_anterior(docs):
+    return json.dumps(jsonable_encoder(convert_objectid_to_str(docs))).encode()
+
+
+def camino_orjson(docs):
+    return BSONJSONResponse(docs).body
+
+
+def main(args):
+    docs = generar_documentos(args.documentos)
+    resultados = {}
+    for nombre, funcion in [("anterior", camino_anterior), ("orjson", camino_orjson)]:
+        tiempos = timeit.repeat(lambda: funcion(docs), number=1, repeat=args.repeticiones)
+        resultados[nombre] = {"mejor_ms": round(min(tiempos) * 1000, 2), "bytes": len(funcion(docs))}
+    resultados["aceleracion"] = round(resultados["anterior"]["mejor_ms"] / resultados["orjson"]["mejor_ms"], 1)
+    print(json.dumps({"documentos": args.documentos, "resultados": resultados}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documentos", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    main(parser.parse_args())
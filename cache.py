@@ -0,0 +1,233 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+import asyncio
+import hashlib
+import time
+import uuid
+from config import settings
+
+# Caché de entidades (materias y profesores) de lectura directa (read-through).
+# El backend es intercambiable: por defecto vive en memoria del proceso, pero
+# puede reemplazarse por uno compartido cuando se ejecutan varios workers.
+
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+
+# Backend en memoria: LRU acotado por tamaño con expiración por TTL
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EntityCache:
+    def __init__(self, backend: CacheBackend, ttl: float, max_tracked: int = 10000):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale_fills = 0
+        # Generación de invalidación por llave; las llaves descartadas toman la
+        # generación base, así que nunca se pierde una invalidación
+        self.max_tracked = max_tracked
+        self._generation = 0
+        self._base_generation = 0
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+
+    @staticmethod
+    def key(collection: str, entity_id: str) -> str:
+        return f"{collection}:{entity_id}"
+
+    # Regresa el documento desde la caché o lo carga con `loader` y lo guarda
+    async def get_or_load(self, collection: str, entity_id: str, loader):
+        key = self.key(collection, entity_id)
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self.generation(key)
+        value = await loader()
+        if value is None:
+            return value
+        # Si hubo una escritura mientras se cargaba, el documento leído puede ser
+        # anterior a ella: se regresa a esta petición pero no se guarda
+        if self.generation(key) != generation:
+            self.stale_fills += 1
+            return value
+        await self.backend.set(key, value, self.ttl)
+        return value
+
+    def generation(self, key: str) -> int:
+        return self._invalidated.get(key, self._base_generation)
+
+    async def invalidate(self, collection: str, entity_id: str):
+        key = self.key(collection, entity_id)
+        self._generation += 1
+        self._invalidated[key] = self._generation
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > self.max_tracked:
+            self._invalidated.popitem(last=False)
+            self._base_generation = self._generation
+        await self.backend.delete(key)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "stale_fills": self.stale_fills}
+
+
+ENTITY_CACHE_SIZE = settings.entity_cache_size
+ENTITY_CACHE_TTL = settings.entity_cache_ttl
+
+entity_cache = EntityCache(MemoryCacheBackend(ENTITY_CACHE_SIZE), ENTITY_CACHE_TTL, ENTITY_CACHE_SIZE)
+
+# Reemplazar el backend (por ejemplo, por uno compartido entre workers)
+def set_cache_backend(backend: CacheBackend):
+    entity_cache.backend = backend
+
+
+# Versiones por colección y por documento para las ETags. Las escrituras las
+# incrementan; una petición condicional se responde comparando versiones, sin
+# consultar MongoDB. Las versiones solo cambian con las escrituras que este
+# proceso conoce: sin MULTI_WORKER, lo que escriben otros workers o importer.py
+# no las toca, así que cada ETag lleva además la ventana de tiempo (`ttl`) en la
+# que se emitió y deja de coincidir al terminar, igual que una entrada de la caché
+# de entidades expira con su TTL. Con MULTI_WORKER (ttl=None) las invalidaciones
+# llegan por el canal y las ETags valen hasta la siguiente escritura.
+class VersionTracker:
+    def __init__(self, max_documents: int, ttl: Optional[float] = None):
+        self.max_documents = max_documents
+        self.ttl = ttl
+        self.boot_id = uuid.uuid4().hex[:8]  # Distingue versiones de distintos arranques y workers
+        self._counter = 0
+        self._collections = {}
+        self._base = {}  # Versión de los documentos sin entrada propia
+        self._documents: "OrderedDict[tuple, int]" = OrderedDict()
+
+    # Se llama al arrancar cada worker, después del fork (ver invalidation.init_worker)
+    def restart(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+
+    def bump(self, collection: str, document_id: Optional[str] = None):
+        self._counter += 1
+        self._collections[collection] = self._counter
+        if document_id is not None:
+            key = (collection, document_id)
+            self._documents[key] = self._counter
+            self._documents.move_to_end(key)
+            # Al descartar una entrada, todos los documentos sin entrada cambian de versión
+            while len(self._documents) > self.max_documents:
+                (evicted_collection, _), _ = self._documents.popitem(last=False)
+                self._base[evicted_collection] = self._counter
+
+    def collection_version(self, collection: str) -> int:
+        return self._collections.get(collection, 0)
+
+    def document_version(self, collection: str, document_id: str) -> int:
+        return self._documents.get((collection, document_id), self._base.get(collection, 0))
+
+    def etag(self, version: int, variant: str = "") -> str:
+        digest = hashlib.sha1(variant.encode()).hexdigest()[:8]
+        if self.ttl:
+            window = int(time.time() // self.ttl)
+            return f'W/"{self.boot_id}.{window}.{version}.{digest}"'
+        return f'W/"{self.boot_id}.{version}.{digest}"'
+
+
+versions = VersionTracker(ENTITY_CACHE_SIZE, None if settings.multi_worker else settings.etag_ttl)
+
+
+# Coalescencia de lecturas (single-flight): peticiones concurrentes con la misma
+# llave comparten una sola consulta en curso y su resultado ya serializado.
+# Opcionalmente el resultado se reutiliza durante una ventana corta.
+class SingleFlight:
+    def __init__(self, reuse_window: float, max_entries: int = 1000):
+        self.reuse_window = reuse_window
+        self.max_entries = max_entries
+        self.requests = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.reused = 0
+        self._inflight = {}
+        self._recent: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def do(self, key: str, func):
+        self.requests += 1
+        entry = self._recent.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self.reused += 1
+                return entry[0]
+            del self._recent[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # shield: si una petición se cancela, la consulta compartida continúa para las demás
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task):
+        self._inflight.pop(key, None)
+        if self.reuse_window > 0 and not task.cancelled() and task.exception() is None:
+            self._recent[key] = (task.result(), time.monotonic() + self.reuse_window)
+            while len(self._recent) > self.max_entries:
+                self._recent.popitem(last=False)
+
+    def stats(self) -> dict:
+        saved = self.requests - self.executions
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "reused": self.reused,
+            "coalescing_ratio": round(saved / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+singleflight = SingleFlight(settings.singleflight_reuse_ms / 1000)
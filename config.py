@@ -1,10 +1,106 @@
-from pymongo import MongoClient
+from dataclasses import dataclass
+from typing import Optional
+import os
+import tempfile
+from dotenv import load_dotenv
 
-# Configuración de MongoDB
-client = MongoClient("mongodb://localhost:27017/")
-db = client["proyecto_ll"]
+# Cargar variables de entorno desde .env
+load_dotenv()
 
-# Colecciones
-users_collection = db["users"]
-subjects_collection = db["subjects"]
+# Configuración única de la aplicación, leída de variables de entorno
+@dataclass(frozen=True)
+class Settings:
+    # MongoDB
+    mongo_uri: str = "mongodb://localhost:27017"
+    mongo_db: str = "proyecto_ll"
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: int = 60000
+    mongo_wait_queue_timeout_ms: int = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_connect_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: int = 30000
+    mongo_compressors: Optional[str] = None  # Por ejemplo "zstd,snappy,zlib"
 
+    # AWS S3
+    s3_bucket: str = "sistemas-ditribuidos-students-images-bucket"
+    s3_max_pool_connections: int = 10
+    s3_connect_timeout: float = 5.0
+    s3_read_timeout: float = 30.0
+    photo_upload_workers: int = 4
+    photo_multipart_threshold: int = 8 * 1024 * 1024
+    photo_cache_dir: str = os.path.join(tempfile.gettempdir(), "photo_cache")
+    photo_cache_max_bytes: int = 512 * 1024 * 1024  # Por worker
+    photo_presign_ttl: int = 3600
+    photo_presign_margin: int = 300  # Un URL firmado deja de repartirse cuando le queda menos que esto
+    photo_client_max_age: int = 3600
+
+    # Contraseñas y tokens
+    bcrypt_rounds: int = 12
+    password_pool_size: int = os.cpu_count() or 1
+    password_queue_limit: int = 256
+    token_cache_size: int = 10000
+    token_cache_ttl: float = 300.0
+
+    # Respuestas: tamaño mínimo para comprimir (gzip/brotli)
+    compression_minimum_size: int = 1024
+
+    # Cachés y métricas
+    entity_cache_size: int = 10000
+    entity_cache_ttl: float = 60.0
+    slow_query_threshold_ms: float = 100.0
+    singleflight_reuse_ms: float = 0.0  # Ventana de reutilización de resultados; 0 = solo coalescencia
+    etag_ttl: float = 60.0  # Sin MULTI_WORKER, vigencia máxima de una ETag (ver cache.VersionTracker)
+
+    # Modo multi-worker: invalidación de cachés entre procesos (invalidation.py)
+    multi_worker: bool = False
+    invalidation_max_await_ms: int = 500
+    invalidation_channel_bytes: int = 16 * 1024 * 1024
+    invalidation_channel_max_events: int = 100000
+
+    # Escritura agrupada de calificaciones (grade_buffer.py)
+    grade_write_behind: bool = False
+    grade_buffer_max_batch: int = 500
+    grade_buffer_max_delay_ms: float = 20.0
+
+    # Control de admisión por clase de ruta (admission.py): peticiones en curso y en cola
+    admission_enabled: bool = True
+    admission_auth_concurrency: int = 32
+    admission_auth_queue: int = 64
+    admission_heavy_concurrency: int = 8
+    admission_heavy_queue: int = 16
+    admission_light_concurrency: int = 512
+    admission_light_queue: int = 1024
+    admission_write_concurrency: int = 128
+    admission_write_queue: int = 256
+    admission_queue_timeout: float = 2.0
+    admission_retry_after: int = 1
+
+    # Límite por usuario (token bucket); 0 lo desactiva
+    rate_limit_per_second: float = 20.0
+    rate_limit_burst: float = 40.0
+    rate_limit_max_users: int = 100000
+
+    # Estadísticas
+    passing_grade: float = 6.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        values = {}
+        for name, field in cls.__dataclass_fields__.items():
+            raw = os.getenv(name.upper())
+            if raw is None:
+                continue
+            default = field.default
+            if isinstance(default, bool):
+                values[name] = raw.lower() in ("1", "true", "yes")
+            elif isinstance(default, int):
+                values[name] = int(raw)
+            elif isinstance(default, float):
+                values[name] = float(raw)
+            else:
+                values[name] = raw
+        return cls(**values)
+
+
+settings = Settings.from_env()
@@ -1,15 +1,55 @@
 from db import db
 from bson import ObjectId
-from auth import hash_password
+from auth import hash_password_async
+from cache import entity_cache
+from invalidation import invalidate
+from serialization import dumps
+from metrics import S3_UPLOAD_LATENCY
+from search import HIDDEN_FIELDS, with_search_terms
+from stats import apply_grade_changes, delete_student_stats, delete_subject_stats, grade_version_filter
 from schemas import *
 from datetime import datetime, date
 from jose import JWTError, jwt
-import boto3
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from config import settings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import asyncio
+import base64
+import csv
+import hashlib
+import io
 import os
-
-# Configurar cliente de AWS S3
-s3_client = boto3.client('s3')
-BUCKET_NAME = "sistemas-ditribuidos-students-images-bucket"
+import threading
+import time
+import uuid
+
+# Configurar cliente de AWS S3: boto3 se importa y el cliente se crea bajo demanda,
+# así el arranque es rápido y cada worker crea el suyo después del fork
+BUCKET_NAME = settings.s3_bucket
+_s3_client = None
+_s3_lock = threading.Lock()
+
+def get_s3_client():
+    global _s3_client
+    with _s3_lock:
+        if _s3_client is None:
+            import boto3
+            from botocore.config import Config
+            _s3_client = boto3.client('s3', config=Config(
+                max_pool_connections=settings.s3_max_pool_connections,
+                connect_timeout=settings.s3_connect_timeout,
+                read_timeout=settings.s3_read_timeout,
+            ))
+        return _s3_client
+
+def close_s3_client():
+    global _s3_client
+    with _s3_lock:
+        if _s3_client is not None:
+            _s3_client.close()
+            _s3_client = None
 
 def convert_objectid_to_str(data):
     if isinstance(data, ObjectId):
@@ -25,16 +65,84 @@ def convert_date_to_datetime(fecha_nacimiento):
         return datetime.combine(fecha_nacimiento, datetime.min.time())
     return fecha_nacimiento
 
+# Paginación por cursor (keyset) sobre _id: el token "after" es opaco para el cliente
+def encode_cursor(last_id: ObjectId) -> str:
+    return base64.urlsafe_b64encode(last_id.binary).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+async def paginate(collection, limit: int, after: Optional[str] = None, query: Optional[dict] = None, projection: Optional[dict] = None):
+    query = dict(query or {})
+    if after:
+        query["_id"] = {"$gt": decode_cursor(after)}
+    # Se pide un documento extra para saber si existe una página siguiente
+    docs = await collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["_id"])
+    return docs, next_cursor
+
+# Campos parciales (?fields=a,b): se traducen a una proyección de Mongo para que
+# los campos no pedidos no se lean, no viajen por la red ni se validen
+def build_projection(model, fields: Optional[str]) -> Optional[dict]:
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(model.model_fields))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    projection = {field: 1 for field in requested if field != "id"}
+    projection["_id"] = 1  # Una proyección vacía regresaría el documento completo
+    return projection
+
+# Documento proyectado con el mismo nombre de ID que los modelos *InDB
+def project_document(doc: dict) -> dict:
+    projected = {"id": str(doc["_id"])}
+    projected.update((key, value) for key, value in doc.items() if key != "_id")
+    return projected
+
+# Lecturas confiables: los documentos de la base los escribió la API después de
+# validarlos, así que no se reconstruye el modelo *InDB (ni se re-ejecutan sus
+# validadores) por cada fila; se arma un diccionario con la misma forma
+@lru_cache(maxsize=None)
+def model_layout(model) -> tuple:
+    return tuple(
+        (name, None if field.is_required() else field.default, field.annotation is date)
+        for name, field in model.model_fields.items()
+    )
+
+def trusted_document(model, doc: dict, document_id: Optional[str] = None) -> dict:
+    result = {}
+    for name, default, is_date in model_layout(model):
+        if name == "id":
+            value = document_id if document_id is not None else str(doc["_id"])
+        else:
+            value = doc.get(name, default)
+            # Documentos antiguos guardaron la fecha como datetime
+            if is_date and isinstance(value, datetime):
+                value = value.date()
+        result[name] = value
+    return result
+
 
 # CRUD
-def create_user(user: UserCreate):
+async def create_user(user: UserCreate):
     user_dict = user.model_dump()
-    user_dict["hashed_password"] = hash_password(user.password)
+    user_dict["hashed_password"] = await hash_password_async(user.password)
     del user_dict["password"]  # Eliminar la contraseña en texto claro
-    db.users.insert_one(user_dict)
+    await db.users.insert_one(user_dict)
+
+async def get_user_by_username(username: str):
+    return await db.users.find_one({"username": username})
 
-def get_user_by_username(username: str):
-    return db.users.find_one({"username": username})
+# Guardar un hash re-generado con el costo actual de bcrypt
+async def update_user_password_hash(username: str, hashed_password: str):
+    await db.users.update_one({"username": username}, {"$set": {"hashed_password": hashed_password}})
 
 def convert_date_to_string(date_obj):
     if isinstance(date_obj, date):
@@ -56,82 +164,109 @@ def serialize_dates(obj):
 #-----------------------------------------------------------------------------------------------------------------------------------------------
 # Funciones CRUD para profesores
 # Crear un nuevo profesor
-def create_professor(professor: ProfesorCreate):
+async def create_professor(professor: ProfesorCreate):
     professor_dict = professor.model_dump()
     professor_dict = serialize_dates(professor_dict)
-    db.professors.insert_one(professor_dict)
+    await db.professors.insert_one(with_search_terms("professors", professor_dict))
+    await invalidate("professors")
 
 
 # Obtener un profesor por su ID
-def get_professor_by_id(professor_id: str) -> Optional[ProfesorInDB]:
-    professor = db.professors.find_one({"_id": ObjectId(professor_id)})
+async def get_professor_by_id(professor_id: str) -> Optional[dict]:
+    professor = await entity_cache.get_or_load(
+        "professors", professor_id,
+        lambda: db.professors.find_one({"_id": ObjectId(professor_id)}),
+    )
     if professor:
-        return ProfesorInDB(**professor, id=professor_id)
+        return trusted_document(ProfesorInDB, professor, professor_id)
     return None
 
 # Obtener todos los profesores
-def get_all_professors() -> list[ProfesorInDB]:
-    professors = list(db.professors.find())
-    return [ProfesorInDB(**professor, id=professor["_id"]) for professor in professors]
+async def get_all_professors() -> list[dict]:
+    professors = await db.professors.find().to_list(length=None)
+    return [trusted_document(ProfesorInDB, professor) for professor in professors]
 
 # Actualizar un profesor
-def update_professor(professor_id: str, updated_data: ProfesorCreate):
+async def update_professor(professor_id: str, updated_data: ProfesorCreate):
     if hasattr(updated_data, 'dob'):
         updated_data.dob = convert_date_to_datetime(updated_data.dob)
     
-    result = db.professors.update_one(
+    result = await db.professors.update_one(
         {"_id": ObjectId(professor_id)}, 
-        {"$set": updated_data.model_dump()}
+        {"$set": with_search_terms("professors", updated_data.model_dump())}
     )
+    await invalidate_professor(professor_id)
     return result.modified_count > 0
 
 # Eliminar un profesor
-def delete_professor(professor_id: str):
-    result = db.professors.delete_one({"_id": ObjectId(professor_id)})
+async def delete_professor(professor_id: str):
+    result = await db.professors.delete_one({"_id": ObjectId(professor_id)})
+    await invalidate_professor(professor_id)
     return result.deleted_count > 0
 
+# Descartar el profesor de la caché de entidades y cambiar su versión (ETag) tras una
+# escritura, en este worker y en los demás
+async def invalidate_professor(professor_id: str):
+    await invalidate("professors", professor_id)
+
 #-----------------------------------------------------------------------------------------------------------------------------------------------
 # Crud para estudiantes
 # Crear un nuevo alumno
-def create_student(student: AlumnoCreate):
+async def create_student(student: AlumnoCreate):
     student_dict = student.model_dump()
     student_dict = serialize_dates(student_dict)
     
-    # Manejo de la imagen
-    student_dict["photo_url"] = upload_image_to_s3(student.photo_url)
+    # Manejo de la imagen: la subida a S3 se hace en segundo plano
+    photo_path = student_dict.pop("photo_url")
+    student_dict.update(prepare_photo_fields(photo_path))
     
-    db.students.insert_one(student_dict)
+    result = await db.students.insert_one(with_search_terms("students", student_dict))
+    schedule_photo_upload(str(result.inserted_id), photo_path, student_dict.get("photo_upload_id"))
 
 # Obtener un alumno por su ID
-def get_student_by_id(student_id: str) -> Optional[AlumnoInDB]:
-    student = db.students.find_one({"_id": ObjectId(student_id)})
+async def get_student_by_id(student_id: str, projection: Optional[dict] = None):
+    student = await db.students.find_one({"_id": ObjectId(student_id)}, projection)
+    if student and projection:
+        return project_document(student)
     if student:
-        return AlumnoInDB(**student, id=student_id)
+        return trusted_document(AlumnoInDB, student, student_id)
     return None
 
 # Obtener todos los alumnos
-def get_all_students() -> list[AlumnoInDB]:
-    students = list(db.students.find())
-    students = [convert_objectid_to_str(student) for student in students]
-    return [AlumnoInDB(**student, id=student['_id']) for student in students]
+async def get_all_students(projection: Optional[dict] = None):
+    students = await db.students.find({}, projection).to_list(length=None)
+    if projection:
+        return [project_document(student) for student in students]
+    return [trusted_document(AlumnoInDB, student) for student in students]
+
+# Obtener una página de alumnos
+async def get_students_page(limit: int, after: Optional[str] = None, projection: Optional[dict] = None):
+    students, next_cursor = await paginate(db.students, limit, after, projection=projection)
+    if projection:
+        return [project_document(student) for student in students], next_cursor
+    return [trusted_document(AlumnoInDB, student) for student in students], next_cursor
 
 # Actualizar un alumno
-def update_student(student_id: str, updated_data: AlumnoCreate):
+async def update_student(student_id: str, updated_data: AlumnoCreate):
     updated_data = updated_data.model_dump()
     updated_data = serialize_dates(updated_data)
     
-    # Manejo de la imagen
-    updated_data["photo_url"] = upload_image_to_s3(updated_data.get("photo_url"))
+    # Manejo de la imagen: una URL de S3 ya subida se conserva sin volver a subirla
+    photo_path = updated_data.pop("photo_url")
+    updated_data.update(prepare_photo_fields(photo_path))
     
-    result = db.students.update_one(
+    result = await db.students.update_one(
         {"_id": ObjectId(student_id)}, 
-        {"$set": updated_data}
+        {"$set": with_search_terms("students", updated_data)}
     )
+    if result.matched_count:
+        schedule_photo_upload(student_id, photo_path, updated_data.get("photo_upload_id"))
     return result.modified_count > 0
 
 # Eliminar un alumno
-def delete_student(student_id: str):
-    result = db.students.delete_one({"_id": ObjectId(student_id)})
+async def delete_student(student_id: str):
+    result = await db.students.delete_one({"_id": ObjectId(student_id)})
+    await delete_student_stats(student_id)
     return result.deleted_count > 0
 
 
@@ -139,72 +274,422 @@ def delete_student(student_id: str):
 
 # Funciones CRUD para materias
 # Crear una nueva materia
-def create_subject(subject: SubjectCreate):
+async def create_subject(subject: SubjectCreate):
     subject_dict = subject.model_dump()
-    db.subjects.insert_one(subject_dict)
+    await db.subjects.insert_one(with_search_terms("subjects", subject_dict))
+    await invalidate("subjects")
 
 # Obtener una materia por su ID
-def get_subject_by_id(subject_id: str) -> Optional[SubjectInDB]:
-    subject = db.subjects.find_one({"_id": ObjectId(subject_id)})
+async def get_subject_by_id(subject_id: str, projection: Optional[dict] = None):
+    subject = await entity_cache.get_or_load(
+        "subjects", subject_id,
+        lambda: db.subjects.find_one({"_id": ObjectId(subject_id)}),
+    )
+    # La materia completa ya está en la caché, así que la proyección se aplica en memoria
+    if subject and projection:
+        return project_document({key: value for key, value in subject.items() if key in projection})
     if subject:
-        return SubjectInDB(**subject, id=subject_id)
+        return trusted_document(SubjectInDB, subject, subject_id)
     return None
 
 
 # Obtener todas las materias
-def get_all_subjects() -> list[SubjectInDB]:
-    subjects = list(db.subjects.find())
-    return [SubjectInDB(**subject, id=subject['_id']) for subject in subjects]
+async def get_all_subjects() -> list[dict]:
+    subjects = await db.subjects.find().to_list(length=None)
+    return [trusted_document(SubjectInDB, subject) for subject in subjects]
 
 # Actualizar una materia
-def update_subject(subject_id: str, updated_data: SubjectCreate):
-    result = db.subjects.update_one(
+async def update_subject(subject_id: str, updated_data: SubjectCreate):
+    result = await db.subjects.update_one(
         {"_id": ObjectId(subject_id)}, 
-        {"$set": updated_data.dict()}
+        {"$set": with_search_terms("subjects", updated_data.dict())}
     )
+    await invalidate_subject(subject_id)
     return result.modified_count > 0
 
 # Eliminar una materia
-def delete_subject(subject_id: str):
-    result = db.subjects.delete_one({"_id": ObjectId(subject_id)})
+async def delete_subject(subject_id: str):
+    result = await db.subjects.delete_one({"_id": ObjectId(subject_id)})
+    await invalidate_subject(subject_id)
+    await delete_subject_stats(subject_id)
     return result.deleted_count > 0
 
+# Descartar la materia de la caché de entidades y cambiar su versión (ETag) tras una
+# escritura, en este worker y en los demás
+async def invalidate_subject(subject_id: str):
+    await invalidate("subjects", subject_id)
+
 
-def get_user_by_id(user_id: str):
+async def get_user_by_id(user_id: str):
     try:
         user_object_id = ObjectId(user_id)
     except Exception:
         return None
-    return db.users.find_one({"_id": user_object_id})
+    return await db.users.find_one({"_id": user_object_id})
 
-def get_subjects_by_professor(professor_id: str):
-    return list(db.subjects.find({"professor_id": professor_id}))
+async def get_subjects_by_professor(professor_id: str):
+    return await db.subjects.find({"professor_id": professor_id}, dict(HIDDEN_FIELDS)).to_list(length=None)
 
 #-----------------------------------------------------------------------------------------------------------------------------------------------
 # Funciones CRUD para inscripciones
-def enroll_student(enrollment: EnrollmentCreate):
+async def enroll_student(enrollment: EnrollmentCreate):
     enrollment_dict = enrollment.model_dump()
-    db.enrollments.insert_one(enrollment_dict)
-
-def get_enrollments_by_student(student_id: str):
-    return list(db.enrollments.find({"student_id": student_id}))
+    await db.enrollments.insert_one(enrollment_dict)
+    await apply_grade_changes([(enrollment.student_id, enrollment.subject_id, None, enrollment.grade, 1)])
+
+async def get_enrollments_by_student(student_id: str):
+    return await db.enrollments.find({"student_id": student_id}).to_list(length=None)
+
+# Documentos de `collection` por _id en una sola consulta ($in); los IDs se guardan como texto
+async def find_by_ids(collection, ids, projection: dict) -> dict:
+    object_ids = {parse_object_id(value or "") for value in ids} - {None}
+    if not object_ids:
+        return {}
+    docs = await collection.find({"_id": {"$in": list(object_ids)}}, projection).to_list(length=None)
+    return {str(doc["_id"]): doc for doc in docs}
+
+# Inscripciones con el nombre de la materia y del profesor: tres consultas por
+# lotes ($in) sin importar cuántas inscripciones tenga el alumno
+async def get_enrollment_details_by_student(student_id: str):
+    enrollments = await db.enrollments.find({"student_id": student_id}, {"subject_id": 1, "grade": 1}).to_list(length=None)
+    subjects = await find_by_ids(db.subjects, {e.get("subject_id") for e in enrollments}, {"name": 1, "professor_id": 1})
+    professors = await find_by_ids(db.professors, {s.get("professor_id") for s in subjects.values()}, {"first_name": 1, "last_name": 1})
+
+    details = []
+    for enrollment in enrollments:
+        subject = subjects.get(enrollment.get("subject_id"), {})
+        professor = professors.get(subject.get("professor_id"))
+        details.append({
+            "subject_name": subject["name"] if subject.get("name") is not None else "Unknown",
+            "professor_name": professor["first_name"] + professor["last_name"] if professor else "Unknown",
+            "grade": enrollment.get("grade"),
+        })
+    return details
+
+async def get_enrollments_by_subject(subject_id: str):
+    return await db.enrollments.find({"subject_id": subject_id}).to_list(length=None)
+
+async def assign_grade(enrollment_id: str, grade: float):
+    enrollment_id = ObjectId(enrollment_id)
+    # Se recupera la calificación anterior para actualizar las estadísticas con la diferencia
+    previous = await db.enrollments.find_one_and_update(
+        {"_id": enrollment_id}, {"$set": {"grade": grade}, "$inc": {"grade_version": 1}},
+        projection={"student_id": 1, "subject_id": 1, "grade": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if previous:
+        await apply_grade_changes([(previous["student_id"], previous["subject_id"], previous.get("grade"), grade, 0)])
 
-def get_enrollments_by_subject(subject_id: str):
-    return list(db.enrollments.find({"subject_id": subject_id}))
+# Operaciones masivas: un resultado por elemento, en el mismo orden que la petición
+def parse_object_id(value: str) -> Optional[ObjectId]:
+    try:
+        return ObjectId(value)
+    except Exception:
+        return None
 
-def assign_grade(enrollment_id: str, grade: float):
-    enrollment_id = ObjectId(enrollment_id)
-    db.enrollments.update_one({"_id": enrollment_id}, {"$set": {"grade": grade}})
+# Ejecutar un bulk_write no ordenado y marcar como error los elementos que fallaron
+async def run_bulk_write(collection, operations, positions, results, ok_status):
+    if not operations:
+        return
+    failed = {}
+    try:
+        await collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            detail = "Student already enrolled in this subject" if error.get("code") == 11000 else error.get("errmsg")
+            failed[error["index"]] = detail
+    for op_index, position in enumerate(positions):
+        if op_index in failed:
+            results[position] = {"index": position, "status": "error", "detail": failed[op_index]}
+        else:
+            results[position] = {"index": position, "status": ok_status}
+
+async def enroll_students_bulk(enrollments: list[EnrollmentCreate]) -> list[dict]:
+    results = [None] * len(enrollments)
+
+    # Validar todas las materias referenciadas con una sola consulta
+    subject_ids = {parse_object_id(e.subject_id) for e in enrollments} - {None}
+    existing = await db.subjects.find({"_id": {"$in": list(subject_ids)}}, {"_id": 1}).to_list(length=None)
+    existing = {str(doc["_id"]) for doc in existing}
+
+    operations, positions = [], []
+    for i, enrollment in enumerate(enrollments):
+        if enrollment.subject_id not in existing:
+            results[i] = {"index": i, "status": "error", "detail": "Subject not found"}
+            continue
+        operations.append(InsertOne(enrollment.model_dump()))
+        positions.append(i)
+
+    await run_bulk_write(db.enrollments, operations, positions, results, "enrolled")
+    await apply_grade_changes([
+        (e.student_id, e.subject_id, None, e.grade, 1)
+        for e, result in zip(enrollments, results) if result["status"] == "enrolled"
+    ])
+    return results
+
+# Intentos de compare-and-set antes de reportar la inscripción como en conflicto
+GRADE_WRITE_ATTEMPTS = 5
+DUPLICATE_KEY = 11000
+
+# Detalles de error de assign_grades_bulk que las rutas distinguen
+ENROLLMENT_NOT_FOUND = "Enrollment not found"
+GRADE_CONFLICT = "Concurrent update, try again"
+
+async def assign_grades_bulk(assignments: list[GradeAssignment]) -> list[dict]:
+    results = [None] * len(assignments)
+
+    # Si una inscripción se repite en la petición gana la última calificación
+    latest, positions = {}, {}
+    for i, assignment in enumerate(assignments):
+        enrollment_id = parse_object_id(assignment.enrollment_id)
+        if enrollment_id is None:
+            results[i] = {"index": i, "status": "error", "detail": ENROLLMENT_NOT_FOUND}
+            continue
+        latest[enrollment_id] = assignment.grade
+        positions.setdefault(enrollment_id, []).append(i)
+
+    def mark(enrollment_id, status, detail=None):
+        for i in positions[enrollment_id]:
+            results[i] = {"index": i, "status": status} if detail is None else {"index": i, "status": status, "detail": detail}
+
+    # Compare-and-set: cada UpdateOne solo aplica si grade_version (que toda
+    # escritura de la calificación incrementa) sigue siendo la que se leyó, así la
+    # diferencia para las estadísticas es exacta aunque otra escritura (otra
+    # petición u otro worker) toque la misma inscripción. Con upsert, una versión
+    # distinta intenta insertar un _id existente y falla con llave duplicada: ese
+    # error identifica la operación que no se aplicó, y se vuelve a leer y reintentar.
+    changes = []
+    pending = set(latest)
+    for _ in range(GRADE_WRITE_ATTEMPTS):
+        if not pending:
+            break
+        current = await db.enrollments.find(
+            {"_id": {"$in": list(pending)}}, {"student_id": 1, "subject_id": 1, "grade": 1, "grade_version": 1}
+        ).to_list(length=None)
+        current = {doc["_id"]: doc for doc in current}
+        for enrollment_id in pending - set(current):
+            mark(enrollment_id, "error", ENROLLMENT_NOT_FOUND)
+        pending &= set(current)
+        if not pending:
+            break
+
+        ordered_ids = list(pending)
+        operations = [
+            UpdateOne(
+                grade_version_filter(enrollment_id, current[enrollment_id].get("grade_version")),
+                {"$set": {"grade": latest[enrollment_id]}, "$inc": {"grade_version": 1}},
+                upsert=True,
+            )
+            for enrollment_id in ordered_ids
+        ]
+        conflicts, upserted = set(), set()
+        try:
+            result = await db.enrollments.bulk_write(operations, ordered=False)
+            upserted = set(result.upserted_ids.values())
+        except BulkWriteError as e:
+            upserted = {item["_id"] for item in e.details.get("upserted", [])}
+            for error in e.details.get("writeErrors", []):
+                enrollment_id = ordered_ids[error["index"]]
+                if error.get("code") == DUPLICATE_KEY:
+                    conflicts.add(enrollment_id)
+                else:
+                    mark(enrollment_id, "error", error.get("errmsg"))
+                    pending.discard(enrollment_id)
+
+        # Una inscripción eliminada después de leerla se habría vuelto a crear vacía
+        if upserted:
+            await db.enrollments.delete_many({"_id": {"$in": list(upserted)}, "student_id": {"$exists": False}})
+            for enrollment_id in upserted:
+                mark(enrollment_id, "error", ENROLLMENT_NOT_FOUND)
+            pending -= upserted
+
+        for enrollment_id in pending - conflicts:
+            previous = current[enrollment_id]
+            changes.append((previous["student_id"], previous["subject_id"], previous.get("grade"), latest[enrollment_id], 0))
+            mark(enrollment_id, "graded")
+        pending = conflicts
+
+    for enrollment_id in pending:
+        mark(enrollment_id, "error", GRADE_CONFLICT)
+
+    await apply_grade_changes(changes)
+    return results
 
 #-----------------------------------------------------------------------------------------------------------------------------------------------
 # AWS
+# Estados de la foto de un alumno
+PHOTO_PENDING = "pending"
+PHOTO_READY = "ready"
+PHOTO_FAILED = "failed"
+
+# Subidas en un pool de hilos; los archivos grandes se suben en partes (multipart)
+PHOTO_UPLOAD_WORKERS = settings.photo_upload_workers
+PHOTO_MULTIPART_THRESHOLD = settings.photo_multipart_threshold
+
+def get_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(multipart_threshold=PHOTO_MULTIPART_THRESHOLD, multipart_chunksize=PHOTO_MULTIPART_THRESHOLD)
+
+_photo_pool: Optional[ThreadPoolExecutor] = None
+_photo_tasks = set()
+
+def get_photo_pool() -> ThreadPoolExecutor:
+    global _photo_pool
+    if _photo_pool is None:
+        _photo_pool = ThreadPoolExecutor(max_workers=PHOTO_UPLOAD_WORKERS, thread_name_prefix="photo-upload")
+    return _photo_pool
+
+def s3_url(key: str) -> str:
+    return f"https://{BUCKET_NAME}.s3.amazonaws.com/{key}"
+
+def is_s3_url(photo_url: Optional[str]) -> bool:
+    return bool(photo_url) and photo_url.startswith(s3_url(""))
+
+# La llave del objeto es el hash del contenido, así la misma foto nunca se sube dos veces
+def photo_key(photo_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(photo_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    extension = os.path.splitext(photo_path)[1].lower()
+    return f"photos/{digest.hexdigest()}{extension}"
+
+def s3_object_exists(key: str) -> bool:
+    from botocore.exceptions import ClientError
+    try:
+        get_s3_client().head_object(Bucket=BUCKET_NAME, Key=key)
+        return True
+    except ClientError:
+        return False
+
+# Miniaturas pre-generadas de cada foto (lado máximo en pixeles); se guardan como
+# JPEG junto al original y comparten su hash de contenido
+THUMBNAIL_SIZES = {"small": 96, "medium": 256, "large": 640}
+
+def thumbnail_key(key: str, size: str) -> str:
+    digest = os.path.splitext(os.path.basename(key))[0]
+    return f"thumbnails/{size}/{digest}.jpg"
+
+def render_thumbnail(source, size: int) -> bytes:
+    from PIL import Image
+    with Image.open(source) as image:
+        image = image.convert("RGB")  # JPEG no tiene canal alfa
+        image.thumbnail((size, size))
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=85, optimize=True)
+    return output.getvalue()
+
+# Generar y subir las miniaturas que falten; `source` es una ruta o un archivo en memoria
+def upload_thumbnails(key: str, source):
+    client = get_s3_client()
+    for size, pixels in THUMBNAIL_SIZES.items():
+        thumbnail = thumbnail_key(key, size)
+        if s3_object_exists(thumbnail):
+            continue
+        if hasattr(source, "seek"):
+            source.seek(0)
+        client.put_object(Bucket=BUCKET_NAME, Key=thumbnail, Body=render_thumbnail(source, pixels), ContentType="image/jpeg")
+
 def upload_image_to_s3(photo_url: Optional[str]) -> Optional[str]:
     if not photo_url or not os.path.exists(photo_url):
         return None  # Retorna None si la imagen no existe
+    start = time.perf_counter()
+    outcome = "uploaded"
     try:
-        file_name = os.path.basename(photo_url)
-        s3_client.upload_file(photo_url, BUCKET_NAME, file_name)
-        return f"https://{BUCKET_NAME}.s3.amazonaws.com/{file_name}"
+        key = photo_key(photo_url)
+        if s3_object_exists(key):
+            outcome = "deduplicated"
+        else:
+            get_s3_client().upload_file(photo_url, BUCKET_NAME, key, Config=get_transfer_config())
+        # Sin miniaturas la foto se sigue sirviendo: /students/{id}/photo las genera al pedirlas
+        try:
+            upload_thumbnails(key, photo_url)
+        except Exception as e:
+            print(f"Error generating thumbnails: {e}")
+        return s3_url(key)
     except Exception as e:
+        outcome = "error"
         print(f"Error uploading to S3: {e}")
         return None
+    finally:
+        S3_UPLOAD_LATENCY.labels(outcome).observe(time.perf_counter() - start)
+
+# Campos de la foto que se guardan al crear/actualizar un alumno; cada escritura
+# cambia photo_upload_id, así una subida pendiente más antigua no sobrescribe la
+# foto (o la ausencia de foto) que se guardó después
+def prepare_photo_fields(photo_path: Optional[str]) -> dict:
+    if is_s3_url(photo_path):
+        return {"photo_url": photo_path, "photo_status": PHOTO_READY, "photo_upload_id": None}
+    if photo_path and os.path.exists(photo_path):
+        return {"photo_url": None, "photo_status": PHOTO_PENDING, "photo_upload_id": uuid.uuid4().hex}
+    return {"photo_url": None, "photo_status": None, "photo_upload_id": None}
+
+async def process_photo_upload(student_id: str, photo_path: str, upload_id: str):
+    loop = asyncio.get_running_loop()
+    url = await loop.run_in_executor(get_photo_pool(), upload_image_to_s3, photo_path)
+    # Solo se aplica si no hubo una subida más reciente para el mismo alumno
+    await db.students.update_one(
+        {"_id": ObjectId(student_id), "photo_upload_id": upload_id},
+        {"$set": {"photo_url": url, "photo_status": PHOTO_READY if url else PHOTO_FAILED}},
+    )
+
+# Lanzar la subida fuera del camino de la petición
+def schedule_photo_upload(student_id: str, photo_path: Optional[str], upload_id: Optional[str]):
+    if not upload_id:
+        return
+    task = asyncio.create_task(process_photo_upload(student_id, photo_path, upload_id))
+    _photo_tasks.add(task)
+    task.add_done_callback(_photo_tasks.discard)
+
+# Esperar las subidas pendientes y cerrar el pool (al apagar la aplicación)
+async def drain_photo_uploads():
+    global _photo_pool
+    if _photo_tasks:
+        await asyncio.gather(*list(_photo_tasks), return_exceptions=True)
+    if _photo_pool is not None:
+        _photo_pool.shutdown(wait=True)
+        _photo_pool = None
+
+#-----------------------------------------------------------------------------------------------------------------------------------------------
+# Exportación masiva: se leen los documentos del cursor por lotes y se emiten
+# directamente como NDJSON o CSV, sin construir la colección completa en memoria
+EXPORT_FIELDS = {
+    "students": ["_id", "first_name", "last_name", "dob", "address", "photo_url", "photo_status"],
+    "professors": ["_id", "first_name", "last_name", "dob", "address", "specialty"],
+    "subjects": ["_id", "name", "description", "professor_id"],
+    "enrollments": ["_id", "student_id", "subject_id", "grade"],
+}
+
+def export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+async def export_collection(collection_name: str, fmt: str = "ndjson", batch_size: int = 1000):
+    fields = EXPORT_FIELDS[collection_name]
+    cursor = db[collection_name].find({}, {field: 1 for field in fields}).batch_size(batch_size)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(fields)
+
+    pending = 0
+    async for doc in cursor:
+        if writer:
+            writer.writerow([export_value(doc.get(field)) for field in fields])
+        else:
+            buffer.write(dumps(doc).decode())
+            buffer.write("\n")
+        pending += 1
+        # Se emite un bloque por cada lote leído de Mongo
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
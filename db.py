@@ -1,10 +1,132 @@
-from pymongo import MongoClient
-import os
-from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT
+from pymongo.errors import OperationFailure
+from config import settings
+from metrics import MongoCommandListener, PoolSaturationListener
 
-# Cargar variables de entorno desde .env
-load_dotenv()
+# Conexión asíncrona a MongoDB (Motor), para no bloquear el event loop.
+# El cliente se crea bajo demanda (después del fork de cada worker) y su ciclo
+# de vida lo controla el lifespan de la aplicación.
+# MONGO_URI=mongomock:// usa una base en memoria (mongomock-motor), útil para
+# benchmarks y pruebas sin un mongod disponible.
+def create_client(uri: str, pool_listener: PoolSaturationListener):
+    if uri and uri.startswith("mongomock://"):
+        from mongomock_motor import AsyncMongoMockClient
+        return AsyncMongoMockClient()
 
-# Conexión a MongoDB
-client = MongoClient(os.getenv("MONGO_URI"))
-db = client[os.getenv("MONGO_DB")]
+    options = {
+        "maxPoolSize": settings.mongo_max_pool_size,
+        "minPoolSize": settings.mongo_min_pool_size,
+        "maxIdleTimeMS": settings.mongo_max_idle_time_ms,
+        "waitQueueTimeoutMS": settings.mongo_wait_queue_timeout_ms,
+        "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+        "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+        "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+    }
+    if settings.mongo_compressors:
+        options["compressors"] = settings.mongo_compressors
+    return AsyncIOMotorClient(uri, event_listeners=[MongoCommandListener(), pool_listener], **options)
+
+
+class MongoManager:
+    def __init__(self):
+        self.client = None
+        self.pool_listener = PoolSaturationListener()
+
+    def connect(self):
+        if self.client is None:
+            self.client = create_client(settings.mongo_uri, self.pool_listener)
+        return self.client
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    @property
+    def database(self):
+        return self.connect()[settings.mongo_db]
+
+    # Saturación del pool de conexiones (para /health)
+    def pool_stats(self) -> dict:
+        stats = self.pool_listener.stats()
+        stats["max_pool_size"] = settings.mongo_max_pool_size
+        stats["saturation"] = round(stats["checked_out"] / settings.mongo_max_pool_size, 4)
+        return stats
+
+    async def ping(self) -> bool:
+        try:
+            await self.database.command("ping")
+            return True
+        except Exception:
+            return False
+
+mongo = MongoManager()
+
+
+# `db` resuelve las colecciones contra el cliente actual, así que puede
+# importarse en cualquier módulo sin abrir conexiones al importar
+class LazyDatabase:
+    def __getattr__(self, name):
+        return getattr(mongo.database, name)
+
+    def __getitem__(self, name):
+        return mongo.database[name]
+
+db = LazyDatabase()
+
+# Índices que necesitan las rutas de acceso de crud.py: (colección, llaves, opciones)
+INDEXES = [
+    ("users", [("username", ASCENDING)], {"unique": True}),
+    ("enrollments", [("student_id", ASCENDING)], {}),
+    ("enrollments", [("subject_id", ASCENDING)], {}),
+    ("enrollments", [("student_id", ASCENDING), ("subject_id", ASCENDING)], {"unique": True}),
+    ("subjects", [("professor_id", ASCENDING)], {}),
+    # Búsqueda (search.py): texto completo y prefijos para type-ahead
+    ("students", [("first_name", TEXT), ("last_name", TEXT)], {"default_language": "none"}),
+    ("professors", [("first_name", TEXT), ("last_name", TEXT)], {"default_language": "none"}),
+    ("subjects", [("name", TEXT), ("description", TEXT)], {"default_language": "spanish", "weights": {"name": 5, "description": 1}}),
+    ("students", [("search_terms", ASCENDING)], {}),
+    ("professors", [("search_terms", ASCENDING)], {}),
+    ("subjects", [("search_terms", ASCENDING)], {}),
+    ("students", [("search_terms.0", ASCENDING), ("_id", ASCENDING)], {}),
+    ("professors", [("search_terms.0", ASCENDING), ("_id", ASCENDING)], {}),
+    ("subjects", [("search_terms.0", ASCENDING), ("_id", ASCENDING)], {}),
+]
+
+# Crear los índices; create_index es idempotente si el índice ya existe
+async def ensure_indexes():
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            print(f"Error creating index {keys} on {collection}: {e}")
+
+# Estadísticas de uso de cada índice ($indexStats), para confirmar que las consultas no hacen COLLSCAN
+async def index_stats():
+    stats = {}
+    for collection in sorted({collection for collection, _, _ in INDEXES}):
+        rows = await db[collection].aggregate([{"$indexStats": {}}]).to_list(length=None)
+        stats[collection] = [
+            {
+                "name": row["name"],
+                "key": row["key"],
+                "ops": row["accesses"]["ops"],
+                "since": row["accesses"]["since"].isoformat(),
+            }
+            for row in rows
+        ]
+    return stats
+
+
+if __name__ == "__main__":
+    # python db.py [indexes|stats]
+    import asyncio
+    import json
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "indexes":
+        asyncio.run(ensure_indexes())
+    else:
+        print(json.dumps(asyncio.run(index_stats()), indent=2, default=str))
@@ -0,0 +1,119 @@
+from itertools import islice
+from typing import Optional
+import asyncio
+import logging
+from crud import assign_grades_bulk
+from schemas import GradeAssignment
+from config import settings
+
+# Escritura agrupada (group commit) de calificaciones para /assign_grade/.
+# Las asignaciones se acumulan en memoria y se escriben en un solo bulk_write
+# cuando se juntan GRADE_BUFFER_MAX_BATCH inscripciones o pasan
+# GRADE_BUFFER_MAX_DELAY_MS desde la primera. Cada petición espera a que su lote
+# quede escrito en MongoDB antes de responder, así que una respuesta exitosa
+# nunca se pierde si el proceso termina. Si una inscripción recibe varias
+# calificaciones en el mismo lote solo se escribe la última.
+
+logger = logging.getLogger("grade_buffer")
+
+
+class GradeBuffer:
+    def __init__(self, max_batch: int, max_delay: float):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        # enrollment_id -> (calificación más reciente, futuros de las peticiones que esperan)
+        self._pending: dict = {}
+        # Se crean dentro del event loop del worker
+        self._full: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+
+    # Encolar una calificación y esperar a que su lote se escriba; regresa el
+    # resultado del elemento tal como lo reporta assign_grades_bulk
+    async def submit(self, enrollment_id: str, grade: float) -> dict:
+        if self._lock is None:
+            self._full = asyncio.Event()
+            self._lock = asyncio.Lock()
+        future = asyncio.get_running_loop().create_future()
+        self.submitted += 1
+        entry = self._pending.get(enrollment_id)
+        if entry is None:
+            self._pending[enrollment_id] = (grade, [future])
+        else:
+            self.coalesced += 1
+            entry[1].append(future)
+            self._pending[enrollment_id] = (grade, entry[1])
+
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        # Si la petición se cancela la calificación se escribe de todas formas
+        return await asyncio.shield(future)
+
+    async def _flush_loop(self):
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.max_delay)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    # Escribir un lote; los lotes se escriben de uno en uno para respetar el orden
+    async def flush(self):
+        if self._lock is None:
+            return
+        async with self._lock:
+            batch = list(islice(self._pending.items(), self.max_batch))
+            for enrollment_id, _ in batch:
+                del self._pending[enrollment_id]
+            if len(self._pending) < self.max_batch:
+                self._full.clear()
+            if not batch:
+                return
+
+            assignments = [GradeAssignment(enrollment_id=enrollment_id, grade=grade) for enrollment_id, (grade, _) in batch]
+            try:
+                results = await assign_grades_bulk(assignments)
+            except Exception as e:
+                self.failures += 1
+                logger.exception("Grade batch of %d failed", len(batch))
+                for _, (_, futures) in batch:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                return
+
+            self.flushes += 1
+            self.written += len(batch)
+            for (_, (_, futures)), result in zip(batch, results):
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+
+    # Escribir todo lo pendiente; se llama al apagar el worker
+    async def drain(self):
+        while self._pending:
+            await self.flush()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failures": self.failures,
+            "average_batch": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+grade_buffer = GradeBuffer(settings.grade_buffer_max_batch, settings.grade_buffer_max_delay_ms / 1000)
@@ -0,0 +1,169 @@
+from db import db
+from crud import (
+    PHOTO_FAILED, PHOTO_READY, get_photo_pool, is_s3_url, serialize_dates, upload_image_to_s3,
+)
+from invalidation import invalidate
+from schemas import AlumnoCreate, ProfesorCreate
+from search import with_search_terms
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+import asyncio
+import codecs
+import csv
+import io
+import json
+
+# Importación masiva de alumnos y profesores desde CSV o NDJSON.
+# El archivo se procesa como flujo: las filas se validan y se insertan por lotes
+# con insert_many, y el reporte (una línea por fila con error más un resumen
+# final) también se emite como flujo, así que la memoria no depende del tamaño
+# del archivo.
+
+MODELS = {
+    "students": AlumnoCreate,
+    "professors": ProfesorCreate,
+}
+
+# Decodificar bloques de bytes en líneas de texto (UTF-8 incremental)
+async def iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+# Registros CSV completos: un campo entre comillas puede abarcar varias líneas,
+# así que se acumulan líneas hasta que las comillas quedan balanceadas
+async def iter_csv_records(lines):
+    record = ""
+    async for line in lines:
+        record += line
+        if record.count('"') % 2 == 0:
+            yield next(csv.reader(io.StringIO(record)), [])
+            record = ""
+    if record:
+        yield next(csv.reader(io.StringIO(record)), [])
+
+# Filas como (número de fila, diccionario); las filas vacías se ignoran
+async def iter_rows(chunks, fmt: str):
+    lines = iter_lines(chunks)
+    if fmt == "csv":
+        header = None
+        row_number = 0
+        async for values in iter_csv_records(lines):
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [value.strip() for value in values]
+                continue
+            row_number += 1
+            yield row_number, {key: (value if value != "" else None) for key, value in zip(header, values)}
+    else:
+        row_number = 0
+        async for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as e:
+                yield row_number, e
+
+# Resolver las fotos del lote en paralelo en el pool de subidas
+async def upload_photos(docs):
+    loop = asyncio.get_running_loop()
+
+    async def resolve(path):
+        if not path or is_s3_url(path):
+            return path
+        return await loop.run_in_executor(get_photo_pool(), upload_image_to_s3, path)
+
+    paths = [doc.pop("photo_url", None) for doc in docs]
+    urls = await asyncio.gather(*[resolve(path) for path in paths])
+    for doc, path, url in zip(docs, paths, urls):
+        doc["photo_url"] = url
+        doc["photo_status"] = (PHOTO_READY if url else PHOTO_FAILED) if path else None
+
+async def insert_batch(collection: str, batch):
+    docs = [with_search_terms(collection, serialize_dates(model.model_dump())) for _, model in batch]
+    if collection == "students":
+        await upload_photos(docs)
+
+    failed = {}
+    try:
+        await db[collection].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed[error["index"]] = error.get("errmsg")
+    await invalidate(collection)
+    return [(batch[index][0], message) for index, message in failed.items()], len(docs) - len(failed)
+
+async def import_rows(collection: str, chunks, fmt: str = "csv", batch_size: int = 1000):
+    model = MODELS[collection]
+    summary = {"rows": 0, "created": 0, "errors": 0}
+    batch = []
+
+    async def flush():
+        errors, created = await insert_batch(collection, batch)
+        summary["created"] += created
+        summary["errors"] += len(errors)
+        batch.clear()
+        return errors
+
+    async for row_number, data in iter_rows(chunks, fmt):
+        summary["rows"] += 1
+        try:
+            if isinstance(data, Exception):
+                raise data
+            batch.append((row_number, model(**data)))
+        except (ValidationError, ValueError, TypeError) as e:
+            summary["errors"] += 1
+            if isinstance(e, ValidationError):
+                details = [{"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()]
+            else:
+                details = str(e)
+            yield {"row": row_number, "status": "error", "errors": details}
+            continue
+
+        if len(batch) >= batch_size:
+            for row, message in await flush():
+                yield {"row": row, "status": "error", "errors": message}
+
+    if batch:
+        for row, message in await flush():
+            yield {"row": row, "status": "error", "errors": message}
+    yield {"summary": summary}
+
+# Bloques de un archivo local (para la línea de comandos)
+async def iter_file_chunks(path: str, chunk_size: int = 64 * 1024):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+if __name__ == "__main__":
+    # python importer.py students alumnos.csv [--batch-size 1000]
+    import argparse
+    from serialization import dumps
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("collection", choices=sorted(MODELS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    async def run():
+        async for record in import_rows(args.collection, iter_file_chunks(args.path), fmt, args.batch_size):
+            print(dumps(record).decode())
+
+    asyncio.run(run())
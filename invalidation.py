@@ -0,0 +1,116 @@
+from db import db
+from cache import entity_cache, versions
+from config import settings
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+from typing import Optional
+import asyncio
+import logging
+import os
+import uuid
+
+# Invalidación entre procesos para el modo multi-worker.
+# Cada escritura se aplica primero a las cachés locales y, si MULTI_WORKER está
+# activo, se publica como evento en una colección capped de MongoDB. Cada worker
+# sigue esa colección con un cursor tailable y descarta las entradas afectadas,
+# así que no se necesita un broker externo. El retraso queda acotado por
+# INVALIDATION_MAX_AWAIT_MS (espera del cursor) y el reintento tras un error.
+
+CHANNEL = "cache_invalidations"
+
+def new_worker_id() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Se vuelve a generar al arrancar cada worker (init_worker): con un servidor que
+# importa la aplicación antes del fork todos los workers heredarían el mismo ID
+WORKER_ID = new_worker_id()
+
+logger = logging.getLogger("invalidation")
+
+stats = {"published": 0, "received": 0, "applied": 0, "reconnects": 0}
+
+async def apply_local(collection: str, document_id: Optional[str] = None):
+    if document_id is not None:
+        await entity_cache.invalidate(collection, document_id)
+    versions.bump(collection, document_id)
+
+# Invalidar en este proceso y avisar a los demás workers
+async def invalidate(collection: str, document_id: Optional[str] = None):
+    await apply_local(collection, document_id)
+    if settings.multi_worker:
+        await db[CHANNEL].insert_one({"origin": WORKER_ID, "collection": collection, "document_id": document_id})
+        stats["published"] += 1
+
+async def ensure_channel():
+    try:
+        await db.create_collection(
+            CHANNEL, capped=True,
+            size=settings.invalidation_channel_bytes, max=settings.invalidation_channel_max_events,
+        )
+        # Un cursor tailable sobre una colección vacía muere de inmediato
+        await db[CHANNEL].insert_one({"origin": WORKER_ID, "collection": None, "document_id": None})
+    except CollectionInvalid:
+        pass  # Ya existe
+    except OperationFailure as e:
+        # Otro worker la creó primero (NamespaceExists en servidores anteriores a 7.0)
+        if e.code != 48:
+            raise
+
+# Seguir el canal y aplicar los eventos publicados por otros workers.
+# Los _id de distintos procesos no son monótonos, así que se reanuda por orden
+# natural (el de inserción en una colección capped) a partir del último evento visto.
+async def listen():
+    last = await db[CHANNEL].find_one({}, sort=[("$natural", -1)])
+    last_id = last["_id"] if last else None
+
+    while True:
+        # Si el último evento ya fue sobrescrito se aplica todo el canal (invalidar de más es seguro)
+        if last_id is not None and not await db[CHANNEL].find_one({"_id": last_id}, {"_id": 1}):
+            last_id = None
+        skipping = last_id is not None
+
+        cursor = db[CHANNEL].find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+        cursor = cursor.max_await_time_ms(settings.invalidation_max_await_ms)
+        try:
+            while cursor.alive:
+                async for event in cursor:
+                    if skipping:
+                        skipping = event["_id"] != last_id
+                        continue
+                    last_id = event["_id"]
+                    stats["received"] += 1
+                    if event.get("origin") == WORKER_ID or event.get("collection") is None:
+                        continue
+                    await apply_local(event["collection"], event.get("document_id"))
+                    stats["applied"] += 1
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.warning("Invalidation channel error: %s", e)
+        stats["reconnects"] += 1
+        await asyncio.sleep(settings.invalidation_max_await_ms / 1000)
+
+_listener: Optional[asyncio.Task] = None
+
+# Identidad propia de este proceso, generada después del fork
+def init_worker():
+    global WORKER_ID
+    WORKER_ID = new_worker_id()
+    versions.restart()
+
+async def start_listener():
+    global _listener
+    init_worker()
+    if settings.multi_worker and _listener is None:
+        await ensure_channel()
+        _listener = asyncio.create_task(listen())
+
+async def stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        try:
+            await _listener
+        except asyncio.CancelledError:
+            pass
+        _listener = None
@@ -1,69 +1,209 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
 from schemas import *
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from crud import *
 from auth import *
 from bson import ObjectId
 from typing import List, Dict
 from datetime import datetime
-
-app = FastAPI()
+from contextlib import asynccontextmanager
+from pymongo.errors import DuplicateKeyError
+from db import ensure_indexes, index_stats, mongo
+from serialization import BSONJSONResponse, dumps
+from importer import MODELS as IMPORT_MODELS, import_rows
+from stats import get_student_gpa, get_subject_stats
+from search import HIDDEN_FIELDS, MAX_SEARCH_OFFSET, PREFIX_FIELDS, search, search_terms
+from metrics import LatencyMiddleware, register_stats, render_metrics
+from config import settings
+from cache import singleflight, versions
+from admission import AdmissionMiddleware, rate_limiter
+from grade_buffer import grade_buffer
+from photos import CACHE_CONTROL as PHOTO_CACHE_CONTROL, SIZES as PHOTO_SIZES, SkipPhotoCompression, disk_cache, get_student_photo_key, photo_etag, photo_redirect, photo_response, presigned_urls
+import admission
+import invalidation
+import math
+
+# Brotli es opcional; si no está instalado se comprime solo con gzip
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# Ciclo de vida de la aplicación: los clientes se crean al arrancar cada worker
+# (después del fork) y se cierran al apagarlo
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mongo.connect()
+    await ensure_indexes()
+    await invalidation.start_listener()
+    yield
+    await invalidation.stop_listener()
+    await grade_buffer.drain()
+    await drain_photo_uploads()
+    shutdown_password_pool()
+    close_s3_client()
+    mongo.close()
+
+app = FastAPI(lifespan=lifespan, default_response_class=BSONJSONResponse)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Compresión de las respuestas grandes (excepto las fotos)
+if BrotliMiddleware is not None:
+    app.add_middleware(SkipPhotoCompression, compressor=BrotliMiddleware, minimum_size=settings.compression_minimum_size, gzip_fallback=True)
+else:
+    app.add_middleware(SkipPhotoCompression, compressor=GZipMiddleware, minimum_size=settings.compression_minimum_size)
+
+# Control de admisión: límites de concurrencia por clase de ruta con cola acotada
+app.add_middleware(AdmissionMiddleware)
+
+# Contadores de las cachés publicados en /metrics
+register_stats("token_cache", token_cache.stats)
+register_stats("entity_cache", entity_cache.stats)
+register_stats("mongo_pool", mongo.pool_stats)
+register_stats("invalidation", lambda: invalidation.stats)
+register_stats("singleflight", singleflight.stats)
+register_stats("admission", admission.stats)
+register_stats("grade_buffer", grade_buffer.stats)
+register_stats("photo_cache", disk_cache.stats)
+register_stats("photo_presign", presigned_urls.stats)
+register_stats("rate_limit", rate_limiter.stats)
+
+# Latencia por ruta (el middleware más externo, así incluye a los demás)
+app.add_middleware(LatencyMiddleware)
+
+# Estado del servicio y saturación del pool de conexiones a MongoDB
+@app.get("/health", include_in_schema=False)
+async def salud():
+    mongo_ok = await mongo.ping()
+    content = {"status": "ok" if mongo_ok else "unavailable", "mongo": {"ping": mongo_ok, **mongo.pool_stats()}}
+    return BSONJSONResponse(content, status_code=200 if mongo_ok else 503)
+
+# Métricas en formato Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metricas():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Tamaño de lote por defecto para las exportaciones
+EXPORT_BATCH_SIZE = 1000
+
+# Máximo de elementos por petición en las operaciones masivas
+MAX_BULK_ITEMS = 10000
+
+# Tamaño de página para los listados paginados
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# ETag de una respuesta: versión de los datos más los parámetros de la petición
+def etag_actual(request: Request, version: int) -> str:
+    return versions.etag(version, str(sorted(request.query_params.multi_items())))
+
+# Verificar If-None-Match; si la ETag coincide se responde 304 sin consultar MongoDB.
+# "*" coincide con cualquier versión, pero solo si el recurso existe: las rutas de
+# un documento verifican primero con exists=False y, ya leído el documento, otra vez
+def no_modificado(request: Request, etag: str, exists: bool = True) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {candidate.strip() for candidate in header.split(",")}
+    return etag in candidates or (exists and "*" in candidates)
+
+def respuesta_con_etag(content, etag: str) -> BSONJSONResponse:
+    return BSONJSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+# Llave de coalescencia: ruta + versión de los datos + parámetros normalizados
+def llave_consulta(request: Request, version: int) -> str:
+    route = request.scope.get("route")
+    path = route.path if route else request.url.path
+    return f"{path}|{request.path_params}|{version}|{sorted(request.query_params.multi_items())}"
+
+def respuesta_no_modificada(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+# Obtener una página de una colección; un cursor inválido es un error del cliente
+async def obtener_pagina(collection, limit: int, after: Optional[str], projection: Optional[dict] = None):
+    try:
+        return await paginate(collection, limit, after, projection=projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Proyección a partir de ?fields=; un campo desconocido es un error del cliente
+def obtener_proyeccion(model, fields: Optional[str]) -> Optional[dict]:
+    try:
+        return build_projection(model, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Si el pool de bcrypt está saturado se responde 503 en lugar de encolar más trabajo
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request, exc: PasswordPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many authentication requests, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
 # Endpoint para obtener el token (login)
 @app.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = get_user_by_username(form_data.username)
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    user = await get_user_by_username(form_data.username)
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password_async(form_data.password, user["hashed_password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Re-hashear de forma transparente los hashes con un costo antiguo
+    if new_hash:
+        await update_user_password_hash(form_data.username, new_hash)
+
     access_token = create_access_token(
         data={"sub": form_data.username, "is_teacher": user["is_teacher"]}
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-# Verificación del token en endpoints protegidos
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        # Decodificar el token JWT
-        user_data = verify_token(token)  # Suponiendo que `verify_token` decodifica el token y verifica su validez.
-    except JWTError:
+# Verificación del token en endpoints protegidos. Es async porque ya no bloquea:
+# así corre en el event loop (sin pasar por el threadpool) y la caché de tokens
+# solo se modifica desde un hilo
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    # Los tokens ya verificados se resuelven desde la caché sin volver a decodificar el JWT
+    user = get_principal_from_token(token)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token or expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    if not user_data:
+
+    # Límite de peticiones por usuario
+    wait = rate_limiter.acquire(user.username)
+    if wait:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token or expired",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(math.ceil(wait))},
         )
-
-    user = UserInDB(
-        username=user_data["sub"],
-        id=user_data["sub"],  # O como sea que almacenaste el ID en tu JWT
-        is_teacher=user_data.get("is_teacher", False),
-        hashed_password="",  # No necesitas el `hashed_password` aquí
-        password=""
-    )
     return user
 
 # Crear usuario (alumno o profesor)
 @app.post("/register/")
 async def register_user(user: UserCreate):
     # Verificar si el usuario ya existe
-    existing_user = get_user_by_username(user.username)
+    existing_user = await get_user_by_username(user.username)
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    create_user(user)
+    try:
+        await create_user(user)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Username already registered")
     return {"message": "User created successfully"}
 
 #---------------------------------------------------------------------------------------------------------------------------------------
@@ -71,74 +211,92 @@ async def register_user(user: UserCreate):
 
 # Inscripción de alumno a materia (Solo para maestros)
 @app.post("/enroll/")
-async def inscribir_estudiante_a_materia(enrollment: EnrollmentCreate, user: UserInDB = Depends(get_current_user)):
+async def inscribir_estudiante_a_materia(enrollment: EnrollmentCreate, user: Principal = Depends(get_current_user)):
     
     # Verificar que el usuario sea maestro
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can enroll")
 
     # Verificar si la materia existe
-    subject = get_subject_by_id(enrollment.subject_id)
+    subject = await get_subject_by_id(enrollment.subject_id)
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
 
-    enroll_student(enrollment)
+    try:
+        await enroll_student(enrollment)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Student already enrolled in this subject")
     return {"message": "Student enrolled successfully"}
 
 # Asignar calificación (solo para profesores)
 @app.put("/assign_grade/")
-async def calificar_estudiente(enrollment_id: str, grade: float, user: UserInDB = Depends(get_current_user)):
+async def calificar_estudiente(enrollment_id: str, grade: float, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario sea profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can assign grades")
 
+    # Modo agrupado: se responde cuando el lote con esta calificación quedó escrito
+    if settings.grade_write_behind:
+        result = await grade_buffer.submit(enrollment_id, grade)
+        if result["status"] == "error":
+            # Un conflicto de compare-and-set se puede reintentar; no significa que la inscripción no exista
+            if result["detail"] == GRADE_CONFLICT:
+                raise HTTPException(status_code=409, detail=result["detail"])
+            if result["detail"] == ENROLLMENT_NOT_FOUND:
+                raise HTTPException(status_code=404, detail=result["detail"])
+            raise HTTPException(status_code=500, detail=result["detail"])
+        return {"message": "Grade assigned successfully"}
+
     # Asignar calificación
-    assign_grade(enrollment_id, grade)
+    await assign_grade(enrollment_id, grade)
     return {"message": "Grade assigned successfully"}
 
+# Inscripción masiva de alumnos (solo para maestros)
+@app.post("/enroll/bulk")
+async def inscribir_estudiantes_masivo(enrollments: List[EnrollmentCreate], user: Principal = Depends(get_current_user)):
+    # Verificar que el usuario sea maestro
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only teachers can enroll")
+
+    if len(enrollments) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+
+    results = await enroll_students_bulk(enrollments)
+    return {"results": results}
+
+# Asignación masiva de calificaciones (solo para profesores)
+@app.put("/assign_grade/bulk")
+async def calificar_estudiantes_masivo(assignments: List[GradeAssignment], user: Principal = Depends(get_current_user)):
+    # Verificar que el usuario sea profesor
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only professors can assign grades")
+
+    if len(assignments) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+
+    results = await assign_grades_bulk(assignments)
+    return {"results": results}
+
 # Ver las materias de un profesor (Solo para profesores)
 @app.get("/showsubjects/{professor_id}")
-async def materias_de_profesor(professor_id: str, user: UserInDB = Depends(get_current_user)):
+async def materias_de_profesor(professor_id: str, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario sea profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can view their subjects")
 
-    subjects = get_subjects_by_professor(professor_id)
-    subjects = convert_objectid_to_str(subjects)
-    return {"subjects": subjects}
+    subjects = await get_subjects_by_professor(professor_id)
+    return BSONJSONResponse({"subjects": subjects})
 
 # Ver las inscripciones de un alumno (Solo para alumnos)
 @app.get("/enrollments/{student_id}")
-async def obtener_materias_estudientes(student_id: str, user: AlumnoCreate = Depends(get_current_user)):
+async def obtener_materias_estudientes(student_id: str, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario sea alumno
     if user.is_teacher:
         raise HTTPException(status_code=403, detail="Only students can view their enrollments")
 
-    enrollments = get_enrollments_by_student(student_id)
-
-    result = []
-
-    for enrollment in enrollments:
-        subject = get_subject_by_id(enrollment["subject_id"])
-        if subject:
-            # Obtener el nombre del profesor
-            professor = get_user_by_id(subject.professor_id)
-            professor_name = professor.first_name + professor.last_name if professor else "Unknown"
-
-            result.append({
-                "subject_name": subject.name, 
-                "professor_name": professor_name,
-                "grade": enrollment.get("grade")
-            })
-        else:
-            result.append({
-                "subject_name": "Unknown", 
-                "professor_name": "Unknown", 
-                "grade": enrollment.get("grade")
-            })
-
-    return convert_objectid_to_str(result)
-    #return {"enrollments": enrollments}
+    # Consultas por lotes: su número no depende de cuántas inscripciones tenga
+    result = await get_enrollment_details_by_student(student_id)
+    return BSONJSONResponse(result)
 
 
 
@@ -148,72 +306,116 @@ async def obtener_materias_estudientes(student_id: str, user: AlumnoCreate = Dep
 # Materias CRUD
 
 @app.get("/subjects/")
-async def obtener_materias():
-    subjects = db.subjects.find()  # Suponiendo que `db.subjects` es la colección de materias
-    return convert_objectid_to_str(list(subjects))
+async def obtener_materias(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    all: bool = False,
+    fields: Optional[str] = None,
+):
+    version = versions.collection_version("subjects")
+    etag = etag_actual(request, version)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    projection = obtener_proyeccion(SubjectInDB, fields)
+
+    # Las peticiones idénticas concurrentes comparten la consulta y el cuerpo serializado
+    async def consultar() -> bytes:
+        # Listado completo sin paginar, solo si se pide explícitamente
+        if all:
+            subjects = await db.subjects.find({}, projection or dict(HIDDEN_FIELDS)).to_list(length=None)  # Suponiendo que `db.subjects` es la colección de materias
+            return dumps(subjects)
+
+        subjects, next_cursor = await obtener_pagina(db.subjects, limit, after, projection or dict(HIDDEN_FIELDS))
+        return dumps({"items": subjects, "next_cursor": next_cursor})
+
+    body = await singleflight.do(llave_consulta(request, version), consultar)
+    return respuesta_con_etag(body, etag)
 
 
 @app.get("/subjects/{subject_id}")
-async def obtener_materia(subject_id: str):
-    # Verificar que el usuario es un profesor
-    
-    subject = get_subject_by_id(subject_id)
-    if not subject:
-        raise HTTPException(status_code=404, detail="Subject not found")
-    
-    return convert_objectid_to_str(subject)
+async def obtener_materia(request: Request, subject_id: str, fields: Optional[str] = None):
+    version = versions.document_version("subjects", subject_id)
+    etag = etag_actual(request, version)
+    if no_modificado(request, etag, exists=False):
+        return respuesta_no_modificada(etag)
+
+    projection = obtener_proyeccion(SubjectInDB, fields)
+
+    # Las peticiones idénticas concurrentes comparten la consulta y el cuerpo serializado
+    async def consultar() -> bytes:
+        subject = await get_subject_by_id(subject_id, projection)
+        if not subject:
+            raise HTTPException(status_code=404, detail="Subject not found")
+        return dumps(subject)
+
+    body = await singleflight.do(llave_consulta(request, version), consultar)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+    return respuesta_con_etag(body, etag)
+
+
+# Estadísticas de calificaciones de una materia (promedio, distribución, aprobación)
+@app.get("/subjects/{subject_id}/stats")
+async def estadisticas_materia(subject_id: str, user: Principal = Depends(get_current_user)):
+    return await get_subject_stats(subject_id)
 
 
 # Crear materia (solo para profesores)
 @app.post("/subjects/")
-async def crear_materia(subject: SubjectCreate, user: UserInDB = Depends(get_current_user)):
+async def crear_materia(subject: SubjectCreate, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario sea profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can create subjects")
 
-    create_subject(subject)
+    await create_subject(subject)
     return {"message": "Subject created successfully"}
 
 @app.put("/subjects/{subject_id}", response_model=SubjectInDB)
-async def actualizar_materia(subject_id: str, subject: SubjectCreate, user: UserInDB = Depends(get_current_user)):
+async def actualizar_materia(subject_id: str, subject: SubjectCreate, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario sea profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can update subjects")
 
     # Buscar la materia por ID
-    existing_subject = db.subjects.find_one({"_id": ObjectId(subject_id)})
+    existing_subject = await db.subjects.find_one({"_id": ObjectId(subject_id)})
     if not existing_subject:
         raise HTTPException(status_code=404, detail="Subject not found")
 
     # Actualizar los campos de la materia (name y description)
     updated_subject = {
         "name": subject.name,
-        "description": subject.description
+        "description": subject.description,
+        "search_terms": search_terms(subject.name),
     }
 
     # Actualizar la materia en la base de datos
-    db.subjects.update_one({"_id": ObjectId(subject_id)}, {"$set": updated_subject})
+    await db.subjects.update_one({"_id": ObjectId(subject_id)}, {"$set": updated_subject})
+    await invalidate_subject(subject_id)
 
     # Obtener la materia actualizada desde la base de datos
-    updated_subject = db.subjects.find_one({"_id": ObjectId(subject_id)})
+    updated_subject = await db.subjects.find_one({"_id": ObjectId(subject_id)}, dict(HIDDEN_FIELDS))
 
     # Convertir el ObjectId a string
-    return convert_objectid_to_str(updated_subject)
+    return BSONJSONResponse(updated_subject)
 
 
 @app.delete("/subjects/{subject_id}")
-async def eliminar_materia(subject_id: str, user: UserInDB = Depends(get_current_user)):
+async def eliminar_materia(subject_id: str, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario sea profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can delete subjects")
 
     # Buscar la materia por ID
-    existing_subject = db.subjects.find_one({"_id": ObjectId(subject_id)})
+    existing_subject = await db.subjects.find_one({"_id": ObjectId(subject_id)})
     if not existing_subject:
         raise HTTPException(status_code=404, detail="Subject not found")
 
     # Eliminar la materia de la base de datos
-    db.subjects.delete_one({"_id": ObjectId(subject_id)})
+    await db.subjects.delete_one({"_id": ObjectId(subject_id)})
+    await invalidate_subject(subject_id)
+    await delete_subject_stats(subject_id)
 
     return {"message": f"Subject with ID {subject_id} deleted successfully"}
 
@@ -223,49 +425,69 @@ async def eliminar_materia(subject_id: str, user: UserInDB = Depends(get_current
 # Profesores
 
 @app.get("/professors/")
-async def obtener_docentes():
-    professors = db.professors.find()
-    return convert_objectid_to_str(list(professors))
+async def obtener_docentes(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    all: bool = False,
+):
+    etag = etag_actual(request, versions.collection_version("professors"))
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    # Listado completo sin paginar, solo si se pide explícitamente
+    if all:
+        professors = await db.professors.find({}, dict(HIDDEN_FIELDS)).to_list(length=None)
+        return respuesta_con_etag(professors, etag)
+
+    professors, next_cursor = await obtener_pagina(db.professors, limit, after, dict(HIDDEN_FIELDS))
+    return respuesta_con_etag({"items": professors, "next_cursor": next_cursor}, etag)
 
 
 @app.get("/professors/{professor_id}")
-async def obtener_docente(professor_id: str):
-    professor = get_professor_by_id(professor_id)
+async def obtener_docente(request: Request, professor_id: str):
+    etag = etag_actual(request, versions.document_version("professors", professor_id))
+    if no_modificado(request, etag, exists=False):
+        return respuesta_no_modificada(etag)
+
+    professor = await get_professor_by_id(professor_id)
     if not professor:
         raise HTTPException(status_code=404, detail="Professor not found")
-    
-    return convert_objectid_to_str(professor)
+    if no_modificado(request, etag):
+        return respuesta_no_modificada(etag)
+
+    return respuesta_con_etag(professor, etag)
 
 
 @app.post("/professors/")
-async def crear_docente(professor: ProfesorCreate, user: UserInDB = Depends(get_current_user)):
+async def crear_docente(professor: ProfesorCreate, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario es un profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can create professors")
 
-    create_professor(professor)
+    await create_professor(professor)
     return {"message": "Professor created successfully"}
 
 
 @app.put("/professors/{professor_id}")
-async def actualizar_docente(professor_id: str, professor_update: ProfesorCreate, user: UserInDB = Depends(get_current_user)):
+async def actualizar_docente(professor_id: str, professor_update: ProfesorCreate, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario es un profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can update professors")
 
-    updated = update_professor(professor_id, professor_update)
+    updated = await update_professor(professor_id, professor_update)
     if not updated:
         raise HTTPException(status_code=404, detail="Professor not found or update failed")
     
     return {"message": "Professor updated successfully"}
 
 @app.delete("/professors/{professor_id}")
-async def eliminar_docente(professor_id: str, user: UserInDB = Depends(get_current_user)):
+async def eliminar_docente(professor_id: str, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario es un profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can delete professors")
 
-    deleted = delete_professor(professor_id)
+    deleted = await delete_professor(professor_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Professor not found")
     
@@ -276,39 +498,83 @@ async def eliminar_docente(professor_id: str, user: UserInDB = Depends(get_curre
 # Alumnos
 
 @app.get("/students/")
-async def obtener_estudiantes():
-    students = get_all_students()
-    return students
+async def obtener_estudiantes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    all: bool = False,
+    fields: Optional[str] = None,
+):
+    projection = obtener_proyeccion(AlumnoInDB, fields)
+
+    # Listado completo sin paginar, solo si se pide explícitamente
+    if all:
+        students = await get_all_students(projection)
+        return BSONJSONResponse(students)
+
+    try:
+        students, next_cursor = await get_students_page(limit, after, projection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BSONJSONResponse({"items": students, "next_cursor": next_cursor})
 
 
 @app.get("/students/{student_id}")
-async def obtener_estudiante(student_id: str):
+async def obtener_estudiante(student_id: str, fields: Optional[str] = None):
     # Verificar que el usuario tiene permisos para ver la información del alumno
     
-    student = get_student_by_id(student_id)
+    student = await get_student_by_id(student_id, obtener_proyeccion(AlumnoInDB, fields))
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    return convert_objectid_to_str(student)
+    return BSONJSONResponse(student)
+
+
+# Promedio general de un alumno
+@app.get("/students/{student_id}/gpa")
+async def promedio_estudiante(student_id: str, user: Principal = Depends(get_current_user)):
+    return await get_student_gpa(student_id)
+
+
+# Foto de un alumno en una de las medidas pre-generadas; redirect=true responde
+# con un URL firmado de S3 en lugar de servir los bytes
+@app.get("/students/{student_id}/photo")
+async def foto_estudiante(
+    request: Request,
+    student_id: str,
+    size: str = Query("medium", regex=f"^({'|'.join(PHOTO_SIZES)})$"),
+    redirect: bool = False,
+):
+    key = await get_student_photo_key(student_id)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+
+    if redirect:
+        return await photo_redirect(key, size)
+
+    etag = photo_etag(key, size)
+    if no_modificado(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": PHOTO_CACHE_CONTROL})
+
+    return await photo_response(request, key, size)
 
 
 @app.post("/students/")
-async def crear_estudiente(student: AlumnoCreate, user: UserInDB = Depends(get_current_user)):
+async def crear_estudiente(student: AlumnoCreate, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario es un profesor, porque solo los profesores pueden crear alumnos
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can create students")
 
-    create_student(student)
+    await create_student(student)
     return {"message": "Student created successfully"}
 
 
 @app.put("/students/{student_id}")
-async def actualizar_estudiente(student_id: str, student_update: AlumnoCreate, user: UserInDB = Depends(get_current_user)):
+async def actualizar_estudiente(student_id: str, student_update: AlumnoCreate, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario es un profesor
     if user.is_teacher:
         raise HTTPException(status_code=403, detail="Only students can update students")
 
-    updated = update_student(student_id, student_update)
+    updated = await update_student(student_id, student_update)
     if not updated:
         raise HTTPException(status_code=404, detail="Student not found or update failed")
 
@@ -316,14 +582,126 @@ async def actualizar_estudiente(student_id: str, student_update: AlumnoCreate, u
 
 
 @app.delete("/students/{student_id}")
-async def eliminar_estudiente(student_id: str, user: UserInDB = Depends(get_current_user)):
+async def eliminar_estudiente(student_id: str, user: Principal = Depends(get_current_user)):
     # Verificar que el usuario es un profesor
     if not user.is_teacher:
         raise HTTPException(status_code=403, detail="Only professors can delete students")
 
-    deleted = delete_student(student_id)
+    deleted = await delete_student(student_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Student not found")
 
     return {"message": "Student deleted successfully"}
 
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Búsqueda
+
+# Buscar alumnos, profesores o materias; typeahead=true busca por prefijo del nombre
+@app.get("/search/{collection}")
+async def buscar(
+    collection: str,
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=MAX_SEARCH_OFFSET),
+    typeahead: bool = False,
+):
+    if collection not in PREFIX_FIELDS:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    items, next_offset = await search(collection, q, limit, offset, typeahead)
+    return BSONJSONResponse({"items": items, "next_offset": next_offset})
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Administración
+
+# Uso de los índices de MongoDB (solo para profesores)
+@app.get("/admin/indexes")
+async def estadisticas_indices(user: Principal = Depends(get_current_user)):
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only professors can view index stats")
+
+    return await index_stats()
+
+# Aciertos y fallos de la caché de tokens verificados (solo para profesores)
+@app.get("/admin/token-cache")
+async def estadisticas_cache_tokens(user: Principal = Depends(get_current_user)):
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only professors can view cache stats")
+
+    return token_cache.stats()
+
+# Aciertos y fallos de la caché de materias y profesores (solo para profesores)
+@app.get("/admin/entity-cache")
+async def estadisticas_cache_entidades(user: Principal = Depends(get_current_user)):
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only professors can view cache stats")
+
+    return entity_cache.stats()
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Exportación masiva (sincronización nocturna)
+
+@app.get("/export/{collection}")
+async def exportar_coleccion(
+    collection: str,
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    user: Principal = Depends(get_current_user),
+):
+    # Verificar que el usuario sea profesor
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only professors can export data")
+
+    if collection not in EXPORT_FIELDS:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_collection(collection, format, batch_size),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{collection}.{format}"'},
+    )
+
+
+#---------------------------------------------------------------------------------------------------------------------------------------
+# Importación masiva (alta de un campus nuevo)
+
+# Máximo de filas con error que se incluyen en el reporte; el resumen las cuenta todas
+MAX_IMPORT_ERROR_LINES = 1000
+
+# Bloques del archivo subido; FastAPI lo guarda en un archivo temporal, no en memoria
+async def leer_archivo(file: UploadFile, chunk_size: int = 64 * 1024):
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+@app.post("/import/{collection}")
+async def importar_coleccion(
+    collection: str,
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(ndjson|csv)$"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    user: Principal = Depends(get_current_user),
+):
+    # Verificar que el usuario sea profesor
+    if not user.is_teacher:
+        raise HTTPException(status_code=403, detail="Only professors can import data")
+
+    if collection not in IMPORT_MODELS:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    filename = file.filename or ""
+    fmt = format or ("ndjson" if filename.endswith((".ndjson", ".jsonl")) else "csv")
+
+    # La importación termina dentro del handler: FastAPI cierra el archivo subido
+    # al salir de él, antes de que una respuesta en streaming alcanzara a leerlo.
+    # El reporte es NDJSON: una línea por fila con error y el resumen al final
+    report = []
+    async for record in import_rows(collection, leer_archivo(file), fmt, batch_size):
+        if "summary" in record or len(report) < MAX_IMPORT_ERROR_LINES:
+            report.append(dumps(record) + b"\n")
+    return Response(content=b"".join(report), media_type="application/x-ndjson")
@@ -0,0 +1,192 @@
+from contextvars import ContextVar
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+from config import settings
+import logging
+import threading
+import time
+
+# Métricas de la aplicación en formato Prometheus (expuestas en /metrics)
+registry = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta",
+    ["method", "route", "status"], registry=registry,
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "Latencia de los comandos de MongoDB",
+    ["collection", "command"], registry=registry,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Comandos de MongoDB que fallaron",
+    ["collection", "command"], registry=registry,
+)
+S3_UPLOAD_LATENCY = Histogram(
+    "s3_upload_duration_seconds", "Latencia de las subidas a S3",
+    ["outcome"], registry=registry,
+)
+
+# Consultas más lentas que este umbral se registran en el log junto con la ruta
+SLOW_QUERY_THRESHOLD_MS = settings.slow_query_threshold_ms
+slow_query_logger = logging.getLogger("slow_queries")
+
+# Ruta que originó el trabajo actual; Motor copia el contexto al ejecutar pymongo
+current_route: ContextVar[str] = ContextVar("current_route", default="-")
+
+
+# Contadores internos (cachés, pools, etc.) publicados como gauges
+class StatsCollector:
+    def __init__(self):
+        self._sources = {}
+
+    def add(self, prefix: str, stats_func):
+        self._sources[prefix] = stats_func
+
+    def collect(self):
+        for prefix, stats_func in self._sources.items():
+            for key, value in stats_func().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield GaugeMetricFamily(f"{prefix}_{key}", f"{prefix} {key}", value=value)
+
+stats_collector = StatsCollector()
+registry.register(stats_collector)
+
+def register_stats(prefix: str, stats_func):
+    stats_collector.add(prefix, stats_func)
+
+
+# Listener de comandos de pymongo: tiempo por colección y comando
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event):
+        return (event.connection_id, event.request_id)
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = "-"
+        with self._lock:
+            self._pending[self._key(event)] = (collection, current_route.get())
+
+    def _finish(self, event, failed: bool):
+        with self._lock:
+            collection, route = self._pending.pop(self._key(event), ("-", current_route.get()))
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_LATENCY.labels(collection, event.command_name).observe(seconds)
+        if failed:
+            MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+        if seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            slow_query_logger.warning(
+                "Slow query: %s on %s took %.1f ms (route: %s)",
+                event.command_name, collection, seconds * 1000, route,
+            )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+# Listener del pool de conexiones: conexiones en uso y operaciones esperando una
+class PoolSaturationListener(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self.checked_out = 0
+        self.waiting = 0
+        self.open = 0
+        self._lock = threading.Lock()
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"checked_out": self.checked_out, "waiting": self.waiting, "open": self.open}
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+# Middleware ASGI de latencia por ruta. La plantilla de la ruta se usa como
+# etiqueta para acotar la cardinalidad. El tiempo se toma al enviar el último
+# bloque del cuerpo, así las respuestas en streaming (exportaciones,
+# importaciones, fotos) cuentan completas.
+class LatencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        observed = False
+
+        def observe():
+            nonlocal observed
+            observed = True
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], route.path if route else "unmatched", str(status_code)
+            ).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        token = current_route.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not observed:
+                observe()
+            current_route.reset(token)
+
+
+def render_metrics():
+    return generate_latest(registry), CONTENT_TYPE_LATEST
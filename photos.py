@@ -0,0 +1,319 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import asyncio
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+from fastapi import Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
+from crud import BUCKET_NAME, THUMBNAIL_SIZES, get_s3_client, is_s3_url, parse_object_id, s3_object_exists, s3_url, thumbnail_key, upload_thumbnails
+from db import db
+from config import settings
+
+# Entrega de fotos de alumnos: /students/{id}/photo sirve la miniatura pedida
+# desde una caché LRU en disco delante de S3, con ETag, rangos de bytes y, si se
+# pide, una redirección a un URL firmado que se reutiliza hasta poco antes de
+# expirar. Las llaves de S3 llevan el hash del contenido, así que la ETag se
+# conoce sin descargar nada y una entrada de la caché nunca queda vieja.
+
+ORIGINAL = "original"
+SIZES = (*THUMBNAIL_SIZES, ORIGINAL)
+CHUNK_SIZE = 64 * 1024
+CACHE_CONTROL = f"private, max-age={settings.photo_client_max_age}"
+
+
+# Llave en S3 de la foto original a partir del URL guardado en el alumno
+def source_key(photo_url: Optional[str]) -> Optional[str]:
+    if not is_s3_url(photo_url):
+        return None
+    return photo_url[len(s3_url("")):]
+
+def variant_key(key: str, size: str) -> str:
+    return key if size == ORIGINAL else thumbnail_key(key, size)
+
+def content_type(key: str) -> str:
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+def photo_etag(key: str, size: str) -> str:
+    digest = os.path.splitext(os.path.basename(key))[0]
+    return f'"{digest}-{size}"'
+
+async def get_student_photo_key(student_id: str) -> Optional[str]:
+    _id = parse_object_id(student_id)
+    if _id is None:
+        return None
+    student = await db.students.find_one({"_id": _id}, {"photo_url": 1})
+    return source_key(student.get("photo_url")) if student else None
+
+
+# Caché LRU en disco acotada por bytes; sobrevive a reinicios del worker. Cada
+# worker lleva su propia cuenta sobre el directorio compartido, así que el límite
+# es por worker: con N workers el directorio puede llegar a N × PHOTO_CACHE_MAX_BYTES
+class DiskLRUCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # Recuperar las entradas de una ejecución anterior, de la menos a la más reciente
+    def _load(self):
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                os.remove(entry.path)
+            elif entry.is_file():
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self.size += size
+        self._loaded = True
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[str]:
+        name = self._name(key)
+        with self._lock:
+            self._load()
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return self._path(name)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        name = self._name(key)
+        path = self._path(name)
+        with self._lock:
+            self._load()
+        # Escritura atómica: nunca se lee un archivo a medias
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
+        with self._lock:
+            self.size -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self.size += len(data)
+            self._evict()
+        return path
+
+    def discard(self, key: str):
+        with self._lock:
+            self.size -= self._entries.pop(self._name(key), 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+disk_cache = DiskLRUCache(settings.photo_cache_dir, settings.photo_cache_max_bytes)
+
+
+def download(key: str) -> bytes:
+    return get_s3_client().get_object(Bucket=BUCKET_NAME, Key=key)["Body"].read()
+
+def download_variant(key: str, size: str) -> bytes:
+    from botocore.exceptions import ClientError
+    try:
+        return download(variant_key(key, size))
+    except ClientError as e:
+        if size == ORIGINAL or e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            raise
+    # Fotos subidas antes de que existieran las miniaturas: se generan ahora
+    upload_thumbnails(key, io.BytesIO(download(key)))
+    return download(variant_key(key, size))
+
+# Abrir la variante desde la caché en disco, descargándola de S3 si no está; el
+# archivo se abre aquí mismo para que una evicción posterior no lo afecte
+def open_variant(key: str, size: str):
+    cache_key = variant_key(key, size)
+    for _ in range(2):
+        path = disk_cache.get(cache_key)
+        if path is None:
+            path = disk_cache.put(cache_key, download_variant(key, size))
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            disk_cache.discard(cache_key)
+            continue
+        return f, os.fstat(f.fileno()).st_size
+    raise FileNotFoundError(cache_key)
+
+
+# URLs firmados por llave; se reutilizan mientras les quede más de PHOTO_PRESIGN_MARGIN
+class PresignedURLCache:
+    def __init__(self, ttl: int, margin: int, maxsize: int = 10000):
+        self.ttl = ttl
+        self.margin = min(margin, ttl // 2)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Regresa el URL y los segundos que todavía puede repartirse; `prepare` se
+    # ejecuta antes de firmar uno nuevo (por ejemplo, para generar la miniatura)
+    def get(self, key: str, prepare=None) -> Tuple[str, int]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], int(entry[1] - now)
+            self.misses += 1
+        if prepare is not None:
+            prepare()
+        url = get_s3_client().generate_presigned_url(
+            "get_object", Params={"Bucket": BUCKET_NAME, "Key": key}, ExpiresIn=self.ttl,
+        )
+        with self._lock:
+            self._entries[key] = (url, now + self.ttl - self.margin)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return url, self.ttl - self.margin
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+presigned_urls = PresignedURLCache(settings.photo_presign_ttl, settings.photo_presign_margin)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+# Rango de bytes (inicio, fin inclusivo) de un encabezado Range; None si no hay
+# rango o no se entiende (se responde completo). Varios rangos no se soportan.
+def parse_range(header: Optional[str], total: int) -> Optional[Tuple[int, int]]:
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None:
+        # Sufijo: los últimos `end` bytes
+        if end is None:
+            return None
+        if end <= 0:
+            raise RangeNotSatisfiable()
+        start, end = max(0, total - end), total - 1
+    if start >= total:
+        raise RangeNotSatisfiable()
+    if end is None:
+        end = total - 1
+    elif end < start:
+        # Un último byte explícito antes del primero es un rango inválido y se ignora (RFC 9110)
+        return None
+    return start, min(end, total - 1)
+
+def iter_file(f, start: int, length: int):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+# El URL firmado debe apuntar a un objeto existente, así que se generan las
+# miniaturas de las fotos que todavía no las tienen
+def ensure_variant(key: str, size: str):
+    if size != ORIGINAL and not s3_object_exists(variant_key(key, size)):
+        upload_thumbnails(key, io.BytesIO(download(key)))
+
+async def photo_redirect(key: str, size: str) -> RedirectResponse:
+    loop = asyncio.get_running_loop()
+    url, remaining = await loop.run_in_executor(
+        None, presigned_urls.get, variant_key(key, size), lambda: ensure_variant(key, size)
+    )
+    # El navegador puede reutilizar la redirección mientras el URL siga vigente
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={remaining}"})
+
+async def photo_response(request: Request, key: str, size: str) -> Response:
+    etag = photo_etag(key, size)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+
+    loop = asyncio.get_running_loop()
+    f, total = await loop.run_in_executor(None, open_variant, key, size)
+
+    # If-Range: el rango solo aplica si el cliente tiene la misma versión
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, total)
+    except RangeNotSatisfiable:
+        f.close()
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{total}"})
+
+    media_type = content_type(variant_key(key, size))
+    if byte_range is None:
+        headers["Content-Length"] = str(total)
+        return StreamingResponse(iter_file(f, 0, total), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(iter_file(f, start, end - start + 1), status_code=206, media_type=media_type, headers=headers)
+
+
+# Las fotos ya están comprimidas y se sirven por rangos de bytes, así que no
+# pasan por el middleware de compresión (gzip/brotli)
+class SkipPhotoCompression:
+    def __init__(self, app, compressor, **options):
+        self.app = app
+        self.compressed = compressor(app, **options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/photo"):
+            await self.app(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
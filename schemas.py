@@ -48,6 +48,7 @@ class AlumnoCreate(BaseModel):
 # Clase para el Alumno en la base de datos
 class AlumnoInDB(AlumnoCreate):
     id: str  # ID único para el alumno
+    photo_status: Optional[str] = None  # Estado de la subida de la foto: pending, ready o failed
     class Config:
         # Convertir ObjectId a string automáticamente
         json_encoders = {
@@ -103,4 +104,10 @@ class EnrollmentInDB(EnrollmentCreate):
     class Config:
         json_encoders = {
             ObjectId: str
-        }
\ No newline at end of file
+        }
+
+
+# Calificación individual dentro de una asignación masiva
+class GradeAssignment(BaseModel):
+    enrollment_id: str  # El ID de la inscripción
+    grade: float        # Calificación a asignar
@@ -0,0 +1,115 @@
+from db import db
+from pymongo import ASCENDING, UpdateOne
+from types import MappingProxyType
+import re
+import unicodedata
+
+# Búsqueda de alumnos, profesores y materias.
+# - Texto completo: índice de texto de MongoDB, ordenado por relevancia (textScore).
+# - Type-ahead: cada documento guarda `search_terms`, el nombre normalizado a partir
+#   de cada palabra ("ana garcia", "garcia"); un regex anclado (^prefijo) sobre ese
+#   campo se resuelve como un rango del índice. Los resultados se ordenan por
+#   relevancia (nombre completo que empieza con el prefijo primero) sin ordenar en
+#   memoria: cada grupo se lee en el orden de su índice y se corta con limit.
+
+# Campos que alimentan el type-ahead
+PREFIX_FIELDS = {
+    "students": ["first_name", "last_name"],
+    "professors": ["first_name", "last_name"],
+    "subjects": ["name"],
+}
+
+# Máximo de palabras que generan un término, y de resultados que se pueden saltar
+MAX_TERM_WORDS = 8
+MAX_SEARCH_OFFSET = 1000
+
+# Campos internos que no se regresan al cliente. Es de solo lectura: el driver
+# puede modificar la proyección que recibe, así que se pasa siempre una copia
+# (dict(HIDDEN_FIELDS))
+HIDDEN_FIELDS = MappingProxyType({"search_terms": 0})
+
+# Índices del type-ahead (ver db.INDEXES): el nombre completo normalizado es el
+# primer término, así que los nombres que empiezan con el prefijo se leen ya
+# ordenados de (search_terms.0, _id); las demás palabras, del índice multikey
+FULL_NAME_INDEX = [("search_terms.0", ASCENDING), ("_id", ASCENDING)]
+TERMS_INDEX = [("search_terms", ASCENDING)]
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.lower().split())
+
+def search_terms(*values) -> list[str]:
+    words = normalize(" ".join(value for value in values if value)).split()[:MAX_TERM_WORDS]
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+# Agregar los términos de búsqueda a un documento antes de guardarlo
+def with_search_terms(collection: str, doc: dict) -> dict:
+    doc["search_terms"] = search_terms(*(doc.get(field) for field in PREFIX_FIELDS[collection]))
+    return doc
+
+# Type-ahead por relevancia: primero los nombres completos que empiezan con el
+# prefijo, en orden alfabético (y por _id, para que las páginas sean estables);
+# después los que lo tienen en otra palabra, en el orden del índice de términos.
+# Cada consulta recorre solo el rango de su índice hasta juntar la página.
+async def typeahead_search(collection: str, prefix: str, offset: int, limit: int) -> list:
+    pattern = re.compile("^" + re.escape(prefix))
+    full_name = {"search_terms.0": pattern}
+    cursor = db[collection].find(full_name, dict(HIDDEN_FIELDS)).sort(FULL_NAME_INDEX).skip(offset).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    if len(docs) == limit:
+        return docs
+
+    # Si los nombres completos se acabaron antes de esta página, en el segundo
+    # grupo se salta lo que falte de `offset`
+    skip = 0
+    if not docs and offset:
+        skip = offset - await db[collection].count_documents(full_name, limit=offset)
+    other_words = {"search_terms": pattern, "search_terms.0": {"$not": pattern}}
+    cursor = db[collection].find(other_words, dict(HIDDEN_FIELDS)).hint(TERMS_INDEX).skip(skip).limit(limit - len(docs))
+    return docs + await cursor.to_list(length=limit - len(docs))
+
+async def search(collection: str, q: str, limit: int, offset: int = 0, typeahead: bool = False):
+    # Se pide un documento extra para saber si existe una página siguiente
+    if typeahead:
+        docs = await typeahead_search(collection, normalize(q), offset, limit + 1)
+    else:
+        query = {"$text": {"$search": q}}
+        projection = {"score": {"$meta": "textScore"}, **HIDDEN_FIELDS}
+        # _id desempata los documentos con el mismo textScore
+        sort = [("score", {"$meta": "textScore"}), ("_id", 1)]
+        cursor = db[collection].find(query, projection).sort(sort).skip(offset).limit(limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+
+    next_offset = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        if offset + limit <= MAX_SEARCH_OFFSET:
+            next_offset = offset + limit
+    return docs, next_offset
+
+# Calcular search_terms en los documentos que aún no lo tienen
+async def backfill_search_terms(batch_size: int = 1000):
+    for collection, fields in PREFIX_FIELDS.items():
+        cursor = db[collection].find({"search_terms": {"$exists": False}}, {field: 1 for field in fields})
+        operations = []
+        async for doc in cursor:
+            terms = search_terms(*(doc.get(field) for field in fields))
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"search_terms": terms}}))
+            if len(operations) >= batch_size:
+                await db[collection].bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            await db[collection].bulk_write(operations, ordered=False)
+
+
+if __name__ == "__main__":
+    # python search.py backfill
+    import asyncio
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        asyncio.run(backfill_search_terms())
+        print("Search terms backfilled")
+    else:
+        print("Usage: python search.py backfill")
@@ -0,0 +1,31 @@
+from typing import Any
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import orjson
+
+# Serialización directa de documentos de MongoDB a bytes con orjson.
+# orjson codifica datetime/date de forma nativa; el hook solo cubre los tipos
+# que no conoce, así que no se construyen copias intermedias del documento.
+
+def bson_default(obj: Any):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=bson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Respuesta JSON para documentos de MongoDB; devolverla directamente desde un
+# endpoint evita el paso por jsonable_encoder de FastAPI
+class BSONJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        # Contenido ya serializado (por ejemplo, compartido entre peticiones)
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
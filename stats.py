@@ -0,0 +1,173 @@
+from db import db
+from pymongo import UpdateOne
+from typing import Optional
+import math
+from config import settings
+
+# Estadísticas de calificaciones materializadas por materia (subject_stats) y por
+# alumno (student_stats). Las escrituras de crud.py las mantienen con $inc, así
+# que leerlas cuesta una sola consulta sin importar cuántas inscripciones existan.
+
+# Calificación mínima aprobatoria
+PASSING_GRADE = settings.passing_grade
+
+def is_grade(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def grade_bucket(grade: float) -> str:
+    return str(int(math.floor(min(max(grade, 0), 10))))
+
+# Incrementos que produce pasar de `old_grade` a `new_grade` (None = sin calificar)
+def grade_increments(old_grade, new_grade, enrolled: int = 0, distribution: bool = False) -> dict:
+    inc = {}
+
+    def add(field, value):
+        if value:
+            inc[field] = inc.get(field, 0) + value
+
+    add("enrolled", enrolled)
+    for grade, sign in ((old_grade, -1), (new_grade, 1)):
+        if not is_grade(grade):
+            continue
+        add("graded", sign)
+        add("grade_sum", sign * grade)
+        add("passed", sign if grade >= PASSING_GRADE else 0)
+        if distribution:
+            add(f"distribution.{grade_bucket(grade)}", sign)
+    return inc
+
+# Aplicar una lista de cambios (student_id, subject_id, old_grade, new_grade, enrolled)
+# agrupando los incrementos por documento para hacer un solo bulk_write por colección
+async def apply_grade_changes(changes):
+    subject_incs, student_incs = {}, {}
+    for student_id, subject_id, old_grade, new_grade, enrolled in changes:
+        for target, key, distribution in ((subject_incs, subject_id, True), (student_incs, student_id, False)):
+            inc = target.setdefault(key, {})
+            for field, value in grade_increments(old_grade, new_grade, enrolled, distribution).items():
+                inc[field] = inc.get(field, 0) + value
+
+    for collection, incs in ((db.subject_stats, subject_incs), (db.student_stats, student_incs)):
+        operations = [UpdateOne({"_id": key}, {"$inc": inc}, upsert=True) for key, inc in incs.items() if inc]
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+
+# Filtro de compare-and-set sobre grade_version, que toda escritura de la
+# calificación incrementa; las inscripciones que nunca se calificaron no tienen el campo
+def grade_version_filter(enrollment_id, version: Optional[int]) -> dict:
+    if version is None:
+        return {"_id": enrollment_id, "grade_version": {"$exists": False}}
+    return {"_id": enrollment_id, "grade_version": version}
+
+# Al eliminar un alumno o una materia se eliminan sus inscripciones y sus
+# calificaciones se descuentan del otro lado (promedios de las materias del
+# alumno, GPA de los alumnos de la materia), igual que haría `rebuild`.
+# Se leen todas con un find y se eliminan con un delete_many que solo toma las
+# que conservan la grade_version leída; si alguna cambió mientras tanto queda
+# sin eliminar y se vuelve a leer, así se descuenta la calificación exacta.
+async def delete_enrollments(field: str, entity_id: str):
+    changes = []
+    while True:
+        enrollments = await db.enrollments.find(
+            {field: entity_id}, {"student_id": 1, "subject_id": 1, "grade": 1, "grade_version": 1},
+        ).to_list(length=None)
+        if not enrollments:
+            break
+        result = await db.enrollments.delete_many(
+            {"$or": [grade_version_filter(e["_id"], e.get("grade_version")) for e in enrollments]}
+        )
+        if result.deleted_count == len(enrollments):
+            changes += [(e["student_id"], e["subject_id"], e.get("grade"), None, -1) for e in enrollments]
+            break
+        # Las que siguen existiendo son las que cambiaron; el resto sí se eliminó
+        remaining = await db.enrollments.find(
+            {"_id": {"$in": [e["_id"] for e in enrollments]}}, {"_id": 1}
+        ).to_list(length=None)
+        remaining = {doc["_id"] for doc in remaining}
+        changes += [(e["student_id"], e["subject_id"], e.get("grade"), None, -1) for e in enrollments if e["_id"] not in remaining]
+    await apply_grade_changes(changes)
+
+async def delete_subject_stats(subject_id: str):
+    await delete_enrollments("subject_id", subject_id)
+    await db.subject_stats.delete_one({"_id": subject_id})
+
+async def delete_student_stats(student_id: str):
+    await delete_enrollments("student_id", student_id)
+    await db.student_stats.delete_one({"_id": student_id})
+
+#-----------------------------------------------------------------------------------------------------------------------------------------------
+# Lectura
+
+def summarize(doc: Optional[dict]) -> dict:
+    doc = doc or {}
+    graded = doc.get("graded", 0)
+    return {
+        "enrolled": doc.get("enrolled", 0),
+        "graded": graded,
+        "average": round(doc.get("grade_sum", 0) / graded, 2) if graded else None,
+        "pass_rate": round(doc.get("passed", 0) / graded, 4) if graded else None,
+    }
+
+async def get_subject_stats(subject_id: str) -> dict:
+    doc = await db.subject_stats.find_one({"_id": subject_id})
+    stats = summarize(doc)
+    distribution = (doc or {}).get("distribution", {})
+    stats["distribution"] = {bucket: distribution.get(bucket, 0) for bucket in map(str, range(11))}
+    return stats
+
+async def get_student_gpa(student_id: str) -> dict:
+    doc = await db.student_stats.find_one({"_id": student_id})
+    stats = summarize(doc)
+    return {"enrolled": stats["enrolled"], "graded": stats["graded"], "gpa": stats["average"]}
+
+#-----------------------------------------------------------------------------------------------------------------------------------------------
+# Reconstrucción completa desde enrollments (recuperación)
+
+def rebuild_pipeline(key_field: str, target: str, distribution: bool) -> list:
+    is_number = {"$isNumber": "$grade"}
+    bucket = {"$toString": {"$toInt": {"$floor": {"$min": [{"$max": ["$grade", 0]}, 10]}}}}
+    pipeline = [
+        {"$project": {
+            "key": f"${key_field}",
+            "grade": {"$cond": [is_number, "$grade", None]},
+            "bucket": {"$cond": [is_number, bucket, None]},
+        }},
+        {"$group": {
+            "_id": {"key": "$key", "bucket": "$bucket"},
+            "enrolled": {"$sum": 1},
+            "graded": {"$sum": {"$cond": [{"$ne": ["$bucket", None]}, 1, 0]}},
+            "grade_sum": {"$sum": {"$ifNull": ["$grade", 0]}},
+            "passed": {"$sum": {"$cond": [{"$gte": [{"$ifNull": ["$grade", -1]}, PASSING_GRADE]}, 1, 0]}},
+        }},
+        {"$group": {
+            "_id": "$_id.key",
+            "enrolled": {"$sum": "$enrolled"},
+            "graded": {"$sum": "$graded"},
+            "grade_sum": {"$sum": "$grade_sum"},
+            "passed": {"$sum": "$passed"},
+            "distribution": {"$push": {"k": {"$ifNull": ["$_id.bucket", "none"]}, "v": "$graded"}},
+        }},
+    ]
+    if distribution:
+        pipeline.append({"$set": {"distribution": {"$arrayToObject": {
+            "$filter": {"input": "$distribution", "cond": {"$ne": ["$$this.k", "none"]}},
+        }}}})
+    else:
+        pipeline.append({"$unset": "distribution"})
+    pipeline.append({"$out": target})
+    return pipeline
+
+async def rebuild_stats():
+    await db.enrollments.aggregate(rebuild_pipeline("subject_id", "subject_stats", True)).to_list(length=None)
+    await db.enrollments.aggregate(rebuild_pipeline("student_id", "student_stats", False)).to_list(length=None)
+
+
+if __name__ == "__main__":
+    # python stats.py rebuild
+    import asyncio
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        asyncio.run(rebuild_stats())
+        print("Stats rebuilt")
+    else:
+        print("Usage: python stats.py rebuild")
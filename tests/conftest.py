@@ -0,0 +1,52 @@
+# Pruebas de la aplicación completa sin servicios externos: MongoDB en memoria
+# (mongomock-motor) y S3 simulado con moto. La configuración se lee al importar
+# la aplicación, así que las variables de entorno se fijan antes de importarla.
+import os
+import sys
+import tempfile
+
+os.environ["MONGO_URI"] = "mongomock://"
+os.environ["MONGO_DB"] = "pruebas"
+os.environ["RATE_LIMIT_PER_SECOND"] = "0"
+os.environ["PHOTO_CACHE_DIR"] = tempfile.mkdtemp(prefix="photo_cache_")
+os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from moto import mock_aws
+
+
+@pytest.fixture(scope="session")
+def s3():
+    with mock_aws():
+        from crud import BUCKET_NAME, get_s3_client
+        client = get_s3_client()
+        client.create_bucket(Bucket=BUCKET_NAME)
+        yield client
+
+
+@pytest.fixture(scope="session")
+def client(s3):
+    from main import app
+    with TestClient(app) as client:
+        yield client
+
+
+def auth_headers(username: str, is_teacher: bool) -> dict:
+    from auth import create_access_token
+    token = create_access_token(data={"sub": username, "is_teacher": is_teacher})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def teacher():
+    return auth_headers("profesor", True)
+
+
+@pytest.fixture(scope="session")
+def student():
+    return auth_headers("alumno", False)
@@ -0,0 +1,24 @@
+# Inscripciones de un alumno con el nombre de la materia y del profesor
+from bson import ObjectId
+
+
+def test_enrollment_details(client, student):
+    from db import db
+
+    professor_id, subject_id, student_id = ObjectId(), ObjectId(), str(ObjectId())
+
+    async def seed():
+        await db.professors.insert_one({"_id": professor_id, "first_name": "Rosa", "last_name": "Luna"})
+        await db.subjects.insert_one({"_id": subject_id, "name": "Álgebra", "professor_id": str(professor_id)})
+        await db.enrollments.insert_many([
+            {"student_id": student_id, "subject_id": str(subject_id), "grade": 9.5},
+            {"student_id": student_id, "subject_id": str(ObjectId()), "grade": None},
+        ])
+
+    client.portal.call(seed)
+    response = client.get(f"/enrollments/{student_id}", headers=student)
+    assert response.status_code == 200
+    assert response.json() == [
+        {"subject_name": "Álgebra", "professor_name": "RosaLuna", "grade": 9.5},
+        {"subject_name": "Unknown", "professor_name": "Unknown", "grade": None},
+    ]
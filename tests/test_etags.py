@@ -0,0 +1,34 @@
+# ETags de materias y profesores: If-None-Match con la ETag actual o con "*"
+from bson import ObjectId
+
+
+def test_wildcard_requires_existing_document(client):
+    for collection in ("subjects", "professors"):
+        response = client.get(f"/{collection}/{ObjectId()}", headers={"If-None-Match": "*"})
+        assert response.status_code == 404
+
+
+def test_wildcard_and_current_etag_on_existing_document(client, teacher):
+    body = {"first_name": "Elena", "last_name": "Versiones", "dob": "1970-03-04", "address": "Calle 7", "specialty": "Redes"}
+    assert client.post("/professors/", json=body, headers=teacher).status_code == 200
+    professors = client.get("/professors/", params={"all": "true"}).json()
+    professor_id = next(str(p["_id"]) for p in professors if p["last_name"] == "Versiones")
+
+    response = client.get(f"/professors/{professor_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert client.get(f"/professors/{professor_id}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/professors/{professor_id}", headers={"If-None-Match": "*"}).status_code == 304
+
+
+def test_etags_expire_without_multi_worker(monkeypatch):
+    import cache
+
+    tracker = cache.VersionTracker(10, ttl=60)
+    monkeypatch.setattr(cache.time, "time", lambda: 1000.0)
+    etag = tracker.etag(3)
+    monkeypatch.setattr(cache.time, "time", lambda: 1019.0)
+    assert tracker.etag(3) == etag
+    # Una escritura de otro proceso no cambia la versión, pero la ETag deja de valer al terminar la ventana
+    monkeypatch.setattr(cache.time, "time", lambda: 1021.0)
+    assert tracker.etag(3) != etag
@@ -0,0 +1,113 @@
+# Calificaciones masivas (compare-and-set sobre grade_version) y estadísticas materializadas
+from bson import ObjectId
+
+
+def enroll(client, teacher, student_id, subject_id, grade=None):
+    body = {"student_id": student_id, "subject_id": subject_id, "grade": grade}
+    assert client.post("/enroll/", json=body, headers=teacher).status_code == 200
+
+
+def create_subject(client, teacher, name):
+    body = {"name": name, "description": "Materia de prueba", "professor_id": str(ObjectId())}
+    assert client.post("/subjects/", json=body, headers=teacher).status_code == 200
+    subjects = client.get("/subjects/", params={"all": "true"}).json()
+    return next(str(subject["_id"]) for subject in subjects if subject["name"] == name)
+
+
+def enrollment_ids(client, student_id):
+    from db import db
+    docs = client.portal.call(lambda: db.enrollments.find({"student_id": student_id}).to_list(length=None))
+    return {doc["subject_id"]: doc for doc in docs}
+
+
+def test_bulk_grades_update_stats(client, teacher):
+    student_id = str(ObjectId())
+    math, physics = create_subject(client, teacher, "Cálculo masivo"), create_subject(client, teacher, "Física masiva")
+    enroll(client, teacher, student_id, math, 5.0)
+    enroll(client, teacher, student_id, physics)
+    enrollments = enrollment_ids(client, student_id)
+
+    assignments = [
+        {"enrollment_id": str(enrollments[math]["_id"]), "grade": 7.0},
+        {"enrollment_id": str(enrollments[physics]["_id"]), "grade": 6.0},
+        {"enrollment_id": str(enrollments[math]["_id"]), "grade": 9.0},
+        {"enrollment_id": str(ObjectId()), "grade": 8.0},
+    ]
+    results = client.put("/assign_grade/bulk", json=assignments, headers=teacher).json()["results"]
+    assert [result["status"] for result in results] == ["graded", "graded", "graded", "error"]
+
+    enrollments = enrollment_ids(client, student_id)
+    assert enrollments[math]["grade"] == 9.0 and enrollments[math]["grade_version"] == 1
+    assert "grade_writes" not in enrollments[math]
+    assert client.get(f"/students/{student_id}/gpa", headers=teacher).json() == {"enrolled": 2, "graded": 2, "gpa": 7.5}
+    assert client.get(f"/subjects/{math}/stats", headers=teacher).json()["average"] == 9.0
+
+
+# Otra escritura cambia la calificación entre la lectura y el bulk_write
+class InterleavedWrite:
+    def __init__(self, db, write):
+        self.db = db
+        self.write = write
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    @property
+    def enrollments(self):
+        collection = self.db.enrollments
+        write = self.write
+
+        class Collection:
+            def __getattr__(self, name):
+                return getattr(collection, name)
+
+            async def bulk_write(self, operations, **kwargs):
+                if write:
+                    await write.pop()()
+                return await collection.bulk_write(operations, **kwargs)
+
+        return Collection()
+
+
+def test_stale_version_is_retried(client, teacher, monkeypatch):
+    import crud
+
+    student_id = str(ObjectId())
+    subject_id = create_subject(client, teacher, "Química concurrente")
+    enroll(client, teacher, student_id, subject_id, 4.0)
+    enrollment_id = str(enrollment_ids(client, student_id)[subject_id]["_id"])
+
+    monkeypatch.setattr(crud, "db", InterleavedWrite(crud.db, [lambda: crud.assign_grade(enrollment_id, 2.0)]))
+    results = client.portal.call(crud.assign_grades_bulk, [crud.GradeAssignment(enrollment_id=enrollment_id, grade=8.0)])
+    monkeypatch.undo()
+
+    assert results == [{"index": 0, "status": "graded"}]
+    assert enrollment_ids(client, student_id)[subject_id]["grade_version"] == 2
+    stats = client.get(f"/subjects/{subject_id}/stats", headers=teacher).json()
+    assert stats["graded"] == 1 and stats["average"] == 8.0
+
+
+def test_deleting_subject_discounts_student_stats(client, teacher):
+    student_id = str(ObjectId())
+    kept, deleted = create_subject(client, teacher, "Historia conservada"), create_subject(client, teacher, "Historia eliminada")
+    enroll(client, teacher, student_id, kept, 8.0)
+    enroll(client, teacher, student_id, deleted, 4.0)
+
+    assert client.delete(f"/subjects/{deleted}", headers=teacher).status_code == 200
+    assert list(enrollment_ids(client, student_id)) == [kept]
+    assert client.get(f"/students/{student_id}/gpa", headers=teacher).json() == {"enrolled": 1, "graded": 1, "gpa": 8.0}
+
+
+def test_write_behind_conflict_is_409(client, teacher, monkeypatch):
+    import dataclasses
+    import main
+    from crud import ENROLLMENT_NOT_FOUND, GRADE_CONFLICT
+
+    monkeypatch.setattr(main, "settings", dataclasses.replace(main.settings, grade_write_behind=True))
+    for detail, status in ((GRADE_CONFLICT, 409), (ENROLLMENT_NOT_FOUND, 404)):
+        async def submit(enrollment_id, grade, detail=detail):
+            return {"index": 0, "status": "error", "detail": detail}
+
+        monkeypatch.setattr(main.grade_buffer, "submit", submit)
+        response = client.put("/assign_grade/", params={"enrollment_id": str(ObjectId()), "grade": 7}, headers=teacher)
+        assert response.status_code == status
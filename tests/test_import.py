@@ -0,0 +1,27 @@
+# Importación masiva (/import/{collection}): el reporte NDJSON por fila y el resumen
+import json
+
+
+def report(response):
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_import_csv(client, teacher):
+    csv = "first_name,last_name,dob,address,specialty\nMarta,Importada,1975-05-05,Calle 3,Química\nSin,Fecha,,Calle 4,Física\n"
+    lines = report(client.post("/import/professors", files={"file": ("profesores.csv", csv)}, headers=teacher))
+    assert lines[0]["row"] == 2 and lines[0]["status"] == "error"
+    assert lines[-1] == {"summary": {"rows": 2, "created": 1, "errors": 1}}
+    professors = client.get("/professors/", params={"all": "true"}).json()
+    assert any(professor["last_name"] == "Importada" for professor in professors)
+
+
+def test_import_ndjson(client, teacher):
+    rows = [
+        {"first_name": "Nico", "last_name": "Lineal", "dob": "2005-06-07", "address": "Calle 5"},
+        {"first_name": "Nico", "last_name": "Futuro", "dob": "2999-01-01", "address": "Calle 6"},
+    ]
+    ndjson = "\n".join(json.dumps(row) for row in rows) + "\nno es json\n"
+    lines = report(client.post("/import/students", files={"file": ("alumnos.ndjson", ndjson)}, headers=teacher))
+    assert [line["row"] for line in lines[:-1]] == [2, 3]
+    assert lines[-1] == {"summary": {"rows": 3, "created": 1, "errors": 2}}
@@ -0,0 +1,58 @@
+# Subida de fotos (crud.py) contra S3 simulado: llave por hash del contenido,
+# miniaturas y deduplicación al actualizar un alumno con la misma foto
+import io
+import time
+
+from PIL import Image
+
+from crud import BUCKET_NAME, THUMBNAIL_SIZES, s3_url, thumbnail_key
+from metrics import registry
+
+
+def wait_for_photo(client, student_id, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        student = client.get(f"/students/{student_id}").json()
+        if student["photo_status"] != "pending":
+            return student
+        time.sleep(0.05)
+    raise AssertionError("photo upload did not finish")
+
+
+def uploads(outcome):
+    return registry.get_sample_value("s3_upload_duration_seconds_count", {"outcome": outcome}) or 0
+
+
+def photo_keys(s3, prefix):
+    return [item["Key"] for item in s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=prefix).get("Contents", [])]
+
+
+def test_same_photo_is_uploaded_once(client, s3, teacher, student, tmp_path):
+    output = io.BytesIO()
+    Image.new("RGB", (320, 200), (20, 120, 220)).save(output, "PNG")
+    first, second = tmp_path / "foto.png", tmp_path / "misma_foto.png"
+    first.write_bytes(output.getvalue())
+    second.write_bytes(output.getvalue())
+
+    body = {"first_name": "Dedup", "last_name": "Subidas", "dob": "2003-04-05", "address": "Calle 8", "photo_url": str(first)}
+    assert client.post("/students/", json=body, headers=teacher).status_code == 200
+    students = client.get("/students/", params={"all": "true"}).json()
+    student_id = next(s["id"] for s in students if s["last_name"] == "Subidas")
+
+    created = wait_for_photo(client, student_id)
+    assert created["photo_status"] == "ready"
+    key = created["photo_url"][len(s3_url("")):]
+    before = photo_keys(s3, "photos/")
+    assert key in before
+    for size in THUMBNAIL_SIZES:
+        assert thumbnail_key(key, size) in photo_keys(s3, f"thumbnails/{size}/")
+
+    # Los mismos bytes desde otro archivo: no se vuelve a subir y el URL no cambia
+    uploaded, deduplicated = uploads("uploaded"), uploads("deduplicated")
+    response = client.put(f"/students/{student_id}", json={**body, "photo_url": str(second)}, headers=student)
+    assert response.status_code == 200
+    updated = wait_for_photo(client, student_id)
+    assert updated["photo_status"] == "ready"
+    assert updated["photo_url"] == created["photo_url"]
+    assert photo_keys(s3, "photos/") == before
+    assert (uploads("uploaded"), uploads("deduplicated")) == (uploaded, deduplicated + 1)
@@ -0,0 +1,96 @@
+# Entrega de fotos (photos.py) contra S3 simulado: rangos de bytes, 304 y 307
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+
+from crud import BUCKET_NAME, s3_url, thumbnail_key
+
+
+def jpeg(color) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(output, "JPEG")
+    return output.getvalue()
+
+
+@pytest.fixture(scope="module")
+def photo(client, s3):
+    data = jpeg((200, 30, 30))
+    key = f"photos/{hashlib.sha256(data).hexdigest()}.jpg"
+    s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=data)
+    return key, data
+
+
+@pytest.fixture(scope="module")
+def student_id(client, photo, teacher):
+    body = {"first_name": "Foto", "last_name": "Rangos", "dob": "2001-02-03", "address": "Calle 1", "photo_url": s3_url(photo[0])}
+    assert client.post("/students/", json=body, headers=teacher).status_code == 200
+    students = client.get("/students/", params={"all": "true"}).json()
+    return next(s["id"] for s in students if s["last_name"] == "Rangos")
+
+
+def get_photo(client, student_id, headers=None, **params):
+    return client.get(f"/students/{student_id}/photo", params={"size": "original", **params}, headers=headers or {}, follow_redirects=False)
+
+
+def test_full_photo(client, photo, student_id):
+    response = get_photo(client, student_id)
+    assert response.status_code == 200
+    assert response.content == photo[1]
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_byte_range(client, photo, student_id):
+    response = get_photo(client, student_id, {"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == photo[1][10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(photo[1])}"
+
+
+def test_open_ended_range(client, photo, student_id):
+    response = get_photo(client, student_id, {"Range": "bytes=100-"})
+    assert response.status_code == 206
+    assert response.content == photo[1][100:]
+
+
+def test_suffix_range(client, photo, student_id):
+    response = get_photo(client, student_id, {"Range": "bytes=-25"})
+    assert response.status_code == 206
+    assert response.content == photo[1][-25:]
+    assert response.headers["content-range"] == f"bytes {len(photo[1]) - 25}-{len(photo[1]) - 1}/{len(photo[1])}"
+
+
+def test_inverted_range_is_ignored(client, photo, student_id):
+    response = get_photo(client, student_id, {"Range": "bytes=20-10"})
+    assert response.status_code == 200
+    assert response.content == photo[1]
+
+
+@pytest.mark.parametrize("header", ["bytes=99999-", "bytes=99999-100000", "bytes=-0"])
+def test_unsatisfiable_range(client, photo, student_id, header):
+    response = get_photo(client, student_id, {"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(photo[1])}"
+
+
+def test_if_range_with_other_version_sends_full_photo(client, photo, student_id):
+    response = get_photo(client, student_id, {"Range": "bytes=0-9", "If-Range": '"otra-version"'})
+    assert response.status_code == 200
+    assert response.content == photo[1]
+
+
+def test_not_modified(client, student_id):
+    etag = get_photo(client, student_id).headers["etag"]
+    response = get_photo(client, student_id, {"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+def test_redirect_to_presigned_url(client, s3, photo, student_id):
+    response = get_photo(client, student_id, size="medium", redirect="true")
+    assert response.status_code == 307
+    location = response.headers["location"]
+    assert "thumbnails/medium/" in location and "Signature" in location
+    # La miniatura se generó para que el URL firmado apunte a un objeto existente
+    assert s3.head_object(Bucket=BUCKET_NAME, Key=thumbnail_key(photo[0], "medium"))["ContentType"] == "image/jpeg"
@@ -0,0 +1,45 @@
+# Type-ahead (search.py): orden por relevancia y paginación entre los dos grupos
+import pytest
+
+
+NAMES = [("Ana", "Zamora"), ("Anabel", "Cruz"), ("Luis", "Anaya"), ("Bruno", "Ana"), ("Ana", "Beltrán"), ("Carla", "Ortiz")]
+
+
+@pytest.fixture(scope="module")
+def professors(client, teacher):
+    for first_name, last_name in NAMES:
+        body = {"first_name": first_name, "last_name": last_name, "dob": "1980-01-01", "address": "Calle 2", "specialty": "Historia"}
+        assert client.post("/professors/", json=body, headers=teacher).status_code == 200
+
+
+def typeahead(client, **params):
+    response = client.get("/search/professors", params={"q": "ana", "typeahead": "true", **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def names(page):
+    return [f"{item['first_name']} {item['last_name']}" for item in page["items"]]
+
+
+def test_full_name_matches_first(client, professors):
+    page = typeahead(client)
+    assert names(page)[:3] == ["Ana Beltrán", "Ana Zamora", "Anabel Cruz"]
+    assert sorted(names(page)[3:]) == ["Bruno Ana", "Luis Anaya"]
+    assert "search_terms" not in page["items"][0]
+
+
+def test_pages_cross_both_groups(client, professors):
+    everything = names(typeahead(client))
+    pages = []
+    offset = 0
+    while offset is not None:
+        page = typeahead(client, limit=2, offset=offset)
+        pages += names(page)
+        offset = page["next_offset"]
+    assert pages == everything
+
+
+def test_repeated_queries_keep_working(client, professors):
+    for _ in range(5):
+        assert len(typeahead(client)["items"]) == 5